@@ -1,3 +1,11 @@
 from django.contrib import admin
 
+from .models import IndexedEntry, Posting, IndexStatistics, Link, Outline, PageView
+
 # Register your models here.
+admin.site.register(IndexedEntry)
+admin.site.register(Posting)
+admin.site.register(IndexStatistics)
+admin.site.register(Link)
+admin.site.register(PageView)
+admin.site.register(Outline)
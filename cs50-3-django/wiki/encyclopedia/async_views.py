@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import links, outline, search_index, util, views
+
+# Async versions of the homepage, entry, search and random pages, served through ASGI (see WIKI_ASGI_URLCONF)
+# Entries are read in threads (asyncio.to_thread) and markdown is rendered by a bounded pool of threads, so the event
+# loop keeps accepting requests while they wait. Database queries go through sync_to_async, as Django's ORM requires
+
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+
+# Returns the pool of threads rendering markdown (WIKI_RENDER_WORKERS threads, started on first use)
+def render_executor():
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=settings.WIKI_RENDER_WORKERS,
+                                                  thread_name_prefix="wiki-render")
+        return _render_executor
+
+
+# Returns the html of an entry on the rendering threads (reusing the stored or cached html, see util.entry_html)
+async def render_html(title, md_content):
+    return await asyncio.get_running_loop().run_in_executor(render_executor(), util.entry_html, title, md_content)
+
+
+# Renders the page of an entry, rendering its html while its outline and backlinks are queried
+async def entry_page(request, title, md_content):
+    content, headings, backlinks = await asyncio.gather(
+        render_html(title, md_content),
+        sync_to_async(outline.get_outline)(title),
+        sync_to_async(links.backlinks)(title)
+    )
+    return render(request, "encyclopedia/entry.html", {
+        "title": title,
+        "content": outline.add_anchors(content),
+        "outline": headings,
+        "backlinks": backlinks
+    })
+
+
+# Counts a view of an entry's page when it is sent or revalidated (see views.counts_views)
+def counts_views(view):
+    @functools.wraps(view)
+    async def inner(request, title):
+        response = await view(request, title)
+        if response.status_code in (200, 304):
+            entry_title = await asyncio.to_thread(util.resolve_title, title)
+            if entry_title:
+                util.record_view(entry_title)
+        return response
+    return inner
+
+
+# Async version of Django's condition decorator: the ETag and Last-Modified are computed by coroutines (which read the
+# entry store in threads), since condition would call its functions on the event loop
+def condition(etag_func=None, last_modified_func=None):
+
+    async def no_value(request, *args, **kwargs):
+        return None
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag, last_modified = await asyncio.gather(
+                (etag_func or no_value)(request, *args, **kwargs),
+                (last_modified_func or no_value)(request, *args, **kwargs)
+            )
+            etag = quote_etag(etag) if etag is not None else None
+            last_modified = int(last_modified.timestamp()) if last_modified is not None else None
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            # Adds the ETag and Last-Modified to responses to safe requests (like condition)
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+        return inner
+    return decorator
+
+
+# ETag of the homepage (see views.index_page_etag), computed in a thread
+async def index_etag(request):
+    return await asyncio.to_thread(views.index_page_etag, request)
+
+
+# ETag of an entry page (see views.entry_etag): the remembered hash is looked up in a thread, since it resolves the title
+# and reads the entry's modification time, and the backlinks are queried through sync_to_async
+async def entry_etag(request, title):
+    title = await asyncio.to_thread(util.resolve_title, title)
+    content_hash = await asyncio.to_thread(util.remembered_hash, title) if title else None
+    if content_hash is None:
+        return None
+    return await sync_to_async(views.entry_page_etag)(title, content_hash)
+
+
+# Displays the homepage (see views.index)
+@condition(etag_func=index_etag)
+async def index(request):
+    page = await asyncio.to_thread(views.index_page, request)
+    letters = await asyncio.to_thread(util.catalog.letters)
+    return render(request, "encyclopedia/index.html", {
+        **page,
+        "letters": letters
+    })
+
+
+# Displays the encyclopedia entry page for a specific title (see views.entry)
+@counts_views
+@condition(etag_func=entry_etag)
+async def entry(request, title):
+    title = await asyncio.to_thread(util.resolve_title, title)
+
+    # Streams the pages of large entries instead of loading them into memory
+    if title and (await asyncio.to_thread(util.entry_size, title) or 0) >= settings.WIKI_STREAM_THRESHOLD:
+        response = await sync_to_async(views.streamed_entry_page)(request, title)
+        if response is not None:
+            return response
+
+    md_content, content_hash = await asyncio.to_thread(util.read_entry, title) if title else (None, None)
+    if md_content is None:
+        return render(request, "encyclopedia/error.html", {
+            "message": "Requested page not found"
+        })
+    response = await entry_page(request, title, md_content)
+    response["ETag"] = await sync_to_async(views.entry_page_etag)(title, content_hash)
+    return response
+
+
+# Displays the encyclopedia entry page or search results page for the user's search (see views.search)
+async def search(request):
+    search = request.POST["q"] if request.method == "POST" else request.GET.get("q", "")
+
+    title = await asyncio.to_thread(util.resolve_title, search)
+    md_content = await asyncio.to_thread(util.get_entry, title) if title else None
+    if md_content is not None:
+        return await entry_page(request, title, md_content)
+
+    validentries, similar = await asyncio.gather(
+        sync_to_async(util.search_entries)(search),
+        asyncio.to_thread(util.catalog.similar, search)
+    )
+    snippets = await sync_to_async(search_index.snippets)(validentries, search)
+    return render(request, "encyclopedia/search.html", {
+        "entries": [(title, snippets.get(title)) for title in validentries],
+        "suggestions": [title for title in similar if title not in validentries]
+    })
+
+
+# Displays a random entry page to the user (see views.randomchoice)
+async def randomchoice(request):
+    md_content = None
+    for _ in range(3):
+        entry = await asyncio.to_thread(util.catalog.random_title)
+        if entry is None:
+            break
+        md_content = await asyncio.to_thread(util.get_entry, entry)
+        if md_content is not None:
+            break
+
+    if md_content is None:
+        return render(request, "encyclopedia/error.html", {
+            "message": "There are no entries yet"
+        })
+    return await entry_page(request, entry, md_content)
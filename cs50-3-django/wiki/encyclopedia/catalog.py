@@ -0,0 +1,235 @@
+import bisect
+import hashlib
+import heapq
+import random
+import threading
+
+from .fuzzy import TrigramIndex
+
+
+# Process-wide sorted catalog of encyclopedia entry titles
+# The titles are loaded once and only reloaded when the storage reports a new version (e.g. the entries directory's
+# modification time changed because a file was added or removed outside of the app). Saves and deletes made through
+# the app update the catalog directly. The sorted list is replaced (never modified in place) on every change, so
+# readers can use it without taking the lock.
+class Catalog:
+
+    def __init__(self, scan, storage_version):
+        self._scan = scan
+        self._storage_version = storage_version
+        self._lock = threading.Lock()
+        self._titles = None
+        self._loaded_version = None
+
+        # Case-folded titles in sorted order, alongside the titles themselves, for prefix lookups (autocomplete)
+        self._prefix_index = ([], [])
+
+        # Case-folded title -> stored title, so titles can be looked up ignoring case with a single dict lookup
+        self._canonical = {}
+
+        # Trigrams of every title, for typo-tolerant title matches
+        self._trigram_index = TrigramIndex()
+
+        # Incremented whenever the set of titles changes
+        self.version = 0
+        self._fingerprint = (None, None)
+
+    # Reloads the titles from storage if the storage changed since they were loaded
+    def _refresh(self):
+        storage_version = self._storage_version()
+        if self._titles is not None and storage_version == self._loaded_version:
+            return
+        with self._lock:
+            storage_version = self._storage_version()
+            if self._titles is None or storage_version != self._loaded_version:
+                self._load(self._scan())
+                self._loaded_version = storage_version
+                self.version += 1
+
+    # Builds the sorted titles and every index derived from them
+    def _load(self, titles):
+        self._titles = sorted(titles)
+        pairs = sorted((title.casefold(), title) for title in self._titles)
+        self._prefix_index = ([key for key, _ in pairs], [title for _, title in pairs])
+        self._canonical = {}
+        for key, title in pairs:
+            self._canonical.setdefault(key, title)
+        self._trigram_index = TrigramIndex(self._titles)
+
+    # Adds a title to the sorted titles and every index derived from them
+    def _insert(self, i, title):
+        self._titles = self._titles[:i] + [title] + self._titles[i:]
+        keys, titles = self._prefix_index
+        key = title.casefold()
+        j = bisect.bisect_left(keys, key)
+        while j < len(keys) and keys[j] == key and titles[j] < title:
+            j += 1
+        self._prefix_index = (keys[:j] + [key] + keys[j:], titles[:j] + [title] + titles[j:])
+        self._canonical.setdefault(key, title)
+        self._trigram_index.add(title)
+
+    # Removes a title from the sorted titles and every index derived from them
+    def _delete(self, i, title):
+        self._titles = self._titles[:i] + self._titles[i + 1:]
+        keys, titles = self._prefix_index
+        j = bisect.bisect_left(keys, title.casefold())
+        while titles[j] != title:
+            j += 1
+        keys, titles = self._prefix_index = (keys[:j] + keys[j + 1:], titles[:j] + titles[j + 1:])
+
+        # If another title only differs in case, it becomes the stored title for the case-folded title
+        key = title.casefold()
+        if j < len(keys) and keys[j] == key:
+            self._canonical[key] = titles[j]
+        else:
+            self._canonical.pop(key, None)
+        self._trigram_index.remove(title)
+
+    # Returns the sorted list of all titles (must not be modified by the caller)
+    def titles(self):
+        self._refresh()
+        return self._titles
+
+    # Returns a hash of all titles (the same in every process holding the same titles, unlike version)
+    # It is only recomputed after the titles change
+    def fingerprint(self):
+        titles = self.titles()
+        fingerprint_titles, fingerprint = self._fingerprint
+        if fingerprint_titles is not titles:
+            fingerprint = hashlib.sha256("\n".join(titles).encode("utf-8")).hexdigest()
+            self._fingerprint = (titles, fingerprint)
+        return fingerprint
+
+    # Returns whether an entry with exactly this title exists
+    def contains(self, title):
+        titles = self.titles()
+        i = bisect.bisect_left(titles, title)
+        return i < len(titles) and titles[i] == title
+
+    # Returns a page of up to limit titles in alphabetical order (ignoring case) and the cursor of the next page
+    # The page starts after the title given as cursor (the last title of the previous page), so finding any page
+    # is a binary search. If letter is given, only titles starting with it are included. The next cursor is None
+    # on the last page
+    def page(self, after=None, letter=None, limit=100):
+        self._refresh()
+        keys, titles = self._prefix_index
+        start = 0
+        if after:
+            key = after.casefold()
+            start = bisect.bisect_left(keys, key)
+            while start < len(keys) and keys[start] == key and titles[start] <= after:
+                start += 1
+        if letter:
+            letter = letter.casefold()
+            start = max(start, bisect.bisect_left(keys, letter))
+
+        page = []
+        i = start
+        while i < len(keys) and len(page) < limit:
+            if letter and not keys[i].startswith(letter):
+                break
+            page.append(titles[i])
+            i += 1
+
+        has_next = i < len(keys) and (not letter or keys[i].startswith(letter))
+        return page, (page[-1] if page and has_next else None)
+
+    # Returns which of the given letters have titles starting with them (ignoring case)
+    def letters(self, alphabet="ABCDEFGHIJKLMNOPQRSTUVWXYZ"):
+        self._refresh()
+        keys, _ = self._prefix_index
+        present = []
+        for letter in alphabet:
+            i = bisect.bisect_left(keys, letter.casefold())
+            if i < len(keys) and keys[i].startswith(letter.casefold()):
+                present.append(letter)
+        return present
+
+    # Returns the stored title of an entry, looked up ignoring case, or None if no such entry exists
+    def resolve(self, title):
+        self._refresh()
+        canonical = self._canonical.get(title.casefold())
+        if canonical is not None and canonical != title and self.contains(title):
+            return title
+        return canonical
+
+    # Returns up to limit titles starting with a prefix (ignoring case), in alphabetical order
+    def complete(self, prefix, limit=10):
+        self._refresh()
+        keys, titles = self._prefix_index
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(keys, prefix)
+        matches = []
+        for i in range(start, min(start + limit, len(keys))):
+            if not keys[i].startswith(prefix):
+                break
+            matches.append(titles[i])
+        return matches
+
+    # Returns up to limit titles containing a search (ignoring case), in alphabetical order (ignoring case)
+    # Only the titles having the search's trigrams (see TrigramIndex.substring_candidates) are checked. Searches too
+    # short to have trigrams scan the titles, stopping at the limit
+    def containing(self, query, limit=50):
+        self._refresh()
+        query = query.casefold()
+        with self._lock:
+            candidates = self._trigram_index.substring_candidates(query)
+        if candidates is not None:
+            matches = (title for title in candidates if query in title.casefold())
+            return heapq.nsmallest(limit, matches, key=lambda title: (title.casefold(), title))
+
+        keys, titles = self._prefix_index
+        matches = []
+        for key, title in zip(keys, titles):
+            if len(matches) == limit:
+                break
+            if query in key:
+                matches.append(title)
+        return matches
+
+    # Returns a title chosen uniformly at random in constant time, or None if there are no titles
+    # The sorted titles are never modified in place, so this is safe while other threads add or remove titles
+    def random_title(self):
+        titles = self.titles()
+        return random.choice(titles) if titles else None
+
+    # Returns up to limit titles similar to a search (tolerating typos), most similar first
+    def similar(self, query, limit=10):
+        self._refresh()
+        with self._lock:
+            return self._trigram_index.search(query, limit)
+
+    # Returns the storage's current version (read before saving or deleting an entry, and given to add or remove)
+    def storage_version(self):
+        return self._storage_version()
+
+    # Adopts the storage version after this process changed the storage, but only if the storage was at the version
+    # the titles were loaded from before the change. Otherwise another process may have added or removed entries
+    # too, so the titles are left outdated and reloaded on next use
+    def _adopt_version(self, version_before):
+        if version_before == self._loaded_version:
+            self._loaded_version = self._storage_version()
+
+    # Adds a title after its entry has been saved, given the storage version read before the save
+    def add(self, title, version_before):
+        with self._lock:
+            titles = self._titles
+            if titles is None:
+                return
+            i = bisect.bisect_left(titles, title)
+            if i == len(titles) or titles[i] != title:
+                self._insert(i, title)
+                self.version += 1
+            self._adopt_version(version_before)
+
+    # Removes a title after its entry has been deleted, given the storage version read before the deletion
+    def remove(self, title, version_before):
+        with self._lock:
+            titles = self._titles
+            if titles is None:
+                return
+            i = bisect.bisect_left(titles, title)
+            if i < len(titles) and titles[i] == title:
+                self._delete(i, title)
+                self.version += 1
+            self._adopt_version(version_before)
@@ -0,0 +1,74 @@
+import gzip
+import threading
+
+# Brotli is optional: without it, pages are only precompressed with gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# File extension used for each content encoding (e.g. by the static site export)
+EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+
+# Compression levels: moderate, since html is compressed while a request waits for it (brotli's highest qualities take
+# seconds on large pages for a few percent smaller output)
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+# Per-process counters of how much html was compressed, and how much compressed html was served, for each encoding
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+# Returns the content encodings pages are precompressed with (best compression first)
+def available_encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+# Compresses bytes with a content encoding
+def compress(data, encoding):
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    _record(encoding, "compressed", len(data), len(compressed))
+    return compressed
+
+
+# Returns the best available content encoding accepted by an Accept-Encoding header, or None for uncompressed content
+def choose_encoding(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, parameters = part.strip().partition(";")
+        quality = parameters.strip()
+        if quality.startswith("q=") and quality[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in available_encodings():
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+# Counts compressed html served to a client
+def record_served(encoding, original_size, compressed_size):
+    _record(encoding, "served", original_size, compressed_size)
+
+
+def _record(encoding, event, original_size, compressed_size):
+    with _stats_lock:
+        stats = _stats.setdefault(encoding, {})
+        counts = stats.setdefault(event, {"count": 0, "original_bytes": 0, "compressed_bytes": 0})
+        counts["count"] += 1
+        counts["original_bytes"] += original_size
+        counts["compressed_bytes"] += compressed_size
+
+
+# Returns the compression counters and ratios (compressed size / original size) of each encoding
+def compression_stats():
+    with _stats_lock:
+        stats = {encoding: {event: dict(counts) for event, counts in events.items()} for encoding, events in _stats.items()}
+    for events in stats.values():
+        for counts in events.values():
+            counts["ratio"] = counts["compressed_bytes"] / counts["original_bytes"] if counts["original_bytes"] else 0.0
+    return stats
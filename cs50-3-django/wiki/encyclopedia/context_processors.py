@@ -0,0 +1,8 @@
+from . import util
+
+
+# Tells templates whether entries have a history page (only if the entry store keeps revisions)
+def revisions(request):
+    return {
+        "keeps_revisions": util.keeps_revisions()
+    }
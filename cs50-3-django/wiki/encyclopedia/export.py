@@ -0,0 +1,164 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.template.loader import render_to_string
+from django.utils._os import safe_join
+
+from . import compression, outline, popularity, util
+from .render import md_to_html
+
+# The static site is laid out so nginx can serve it directly in front of Django, e.g.
+#   location = / { try_files /index.html @django; }
+#   location /wiki/ { try_files $uri.html @django; }
+# Every page is also written precompressed (<page>.html.gz, and <page>.html.br if brotli is installed) for nginx's
+# gzip_static and brotli_static
+# Static pages can't hold CSRF tokens, so they are rendered with static_export set: the search box submits with GET,
+# and Edit/Delete are links to Django-served pages (the edit page and a delete confirmation) whose forms have tokens
+
+MANIFEST = ".manifest.json"
+
+# Context of every exported page
+_STATIC_EXPORT = {"static_export": True}
+
+
+# Returns the path of an exported entry page (raises SuspiciousFileOperation if the title would put it outside the
+# export directory)
+def entry_path(directory, title):
+    return safe_join(directory, "wiki", f"{title}.html")
+
+
+# Returns the hash used to tell whether an entry changed since it was last exported
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Writes a file atomically, so the web server never serves a partly written page
+def _write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp{os.getpid()}"
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+
+
+# Writes a page and its precompressed variants
+def _write_page(path, text):
+    data = text.encode("utf-8")
+    for encoding in compression.available_encodings():
+        _write_bytes(path + compression.EXTENSIONS[encoding], compression.compress(data, encoding))
+    _write_bytes(path, data)
+
+
+# Renders an entry page into the export directory
+def export_entry(directory, title, content):
+    html_content = md_to_html(content, title)
+    _write_page(entry_path(directory, title), render_to_string("encyclopedia/entry.html", {
+        "title": title,
+        "content": outline.add_anchors(html_content),
+        "outline": outline.extract_outline(html_content),
+        **_STATIC_EXPORT
+    }))
+
+
+# Renders the homepage (list of all entries) into the export directory
+def export_index(directory):
+    _write_page(os.path.join(directory, "index.html"), render_to_string("encyclopedia/index.html", {
+        "entries": util.list_entries(),
+        **_STATIC_EXPORT
+    }))
+
+
+# Removes an entry page from the export directory
+def remove_entry(directory, title):
+    path = entry_path(directory, title)
+    for extension in [""] + list(compression.EXTENSIONS.values()):
+        try:
+            os.remove(path + extension)
+        except FileNotFoundError:
+            pass
+
+
+# Loads the manifest of an export directory (title -> modification time and hash of the exported entry)
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# Saves the manifest of an export directory
+def save_manifest(directory, manifest):
+    _write_bytes(os.path.join(directory, MANIFEST), json.dumps(manifest).encode("utf-8"))
+
+
+# Worker processes are forked, so they start with Django set up and the same settings as this process (spawned workers
+# would import the app before Django is set up). Where fork isn't available, the batches are exported in this process
+def _worker_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+# Worker process setup: each process opens its own connections to the entry store
+def _init_worker():
+    util.reset_store()
+
+
+# Exports a batch of entries (run in a worker process), skipping entries whose content hash didn't change
+# Returns the new manifest records of the batch
+def _export_batch(directory, batch):
+    store = util.get_store()
+    records = {}
+    for title, old_hash in batch:
+        content = store.get_entry(title)
+        if content is None:
+            continue
+        new_hash = content_hash(content)
+        if new_hash != old_hash or not os.path.exists(entry_path(directory, title)):
+            export_entry(directory, title, content)
+        records[title] = {"modified": store.modified(title), "hash": new_hash}
+    return records
+
+
+# Exports every entry (or, unless full is True, only entries changed since the last export) into a directory
+# Pages are rendered in parallel by a pool of worker processes. Returns the number of entries changed since the last export
+def export_wiki(directory, full=False, workers=None, batch_size=100):
+    store = util.get_store()
+    manifest = {} if full else load_manifest(directory)
+    titles = util.list_entries()
+
+    # Finds the entries whose modification time changed since they were last exported (most viewed entries first, so
+    # their pages are updated first)
+    changed = []
+    for title in titles:
+        record = manifest.get(title)
+        if record is None or record["modified"] != store.modified(title):
+            changed.append((title, record["hash"] if record else None))
+    rank = {title: i for i, title in enumerate(popularity.hot_entries(len(changed)))} if changed else {}
+    changed.sort(key=lambda item: rank.get(item[0], len(rank)))
+
+    # Removes the pages of entries deleted since the last export
+    removed = set(manifest) - set(titles)
+    for title in removed:
+        remove_entry(directory, title)
+        del manifest[title]
+
+    # Renders the changed entries in parallel
+    batches = [changed[i:i + batch_size] for i in range(0, len(changed), batch_size)]
+    context = _worker_context()
+    if batches and context is not None:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            for records in executor.map(_export_batch, [directory] * len(batches), batches):
+                manifest.update(records)
+    else:
+        for batch in batches:
+            manifest.update(_export_batch(directory, batch))
+
+    if changed or removed or not os.path.exists(os.path.join(directory, "index.html")):
+        export_index(directory)
+    save_manifest(directory, manifest)
+    return len(changed)
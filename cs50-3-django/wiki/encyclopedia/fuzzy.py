@@ -0,0 +1,76 @@
+import heapq
+from collections import Counter, defaultdict
+
+# Titles sharing less than this much of their trigrams with a search (Dice coefficient) are not suggested
+SIMILARITY_THRESHOLD = 0.3
+
+# Trigrams found in more titles than this are too common to help find candidates (they are still used for scoring)
+MAX_POSTINGS = 5000
+
+
+# Returns the set of trigrams of a text (each word padded with two spaces in front and one behind, ignoring case)
+def trigrams(text):
+    grams = set()
+    for word in text.casefold().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# Returns the Dice coefficient of two trigram sets (1.0 for identical sets, 0.0 for sets with nothing in common)
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+# Trigram index over entry titles, for typo-tolerant title matches (e.g. "Pyhton" finding "Python")
+# Not thread-safe on its own: the catalog updates and queries it while holding its lock
+class TrigramIndex:
+
+    def __init__(self, titles=()):
+        self._postings = defaultdict(set)
+        self._trigrams = {}
+        for title in titles:
+            self.add(title)
+
+    def add(self, title):
+        grams = trigrams(title)
+        self._trigrams[title] = grams
+        for gram in grams:
+            self._postings[gram].add(title)
+
+    def remove(self, title):
+        for gram in self._trigrams.pop(title, ()):
+            postings = self._postings[gram]
+            postings.discard(title)
+            if not postings:
+                del self._postings[gram]
+
+    # Returns the titles which may contain a search as a substring (ignoring case): those having every trigram inside
+    # the search's words (the padded trigrams at the ends of the words are left out, since a word of the search may be
+    # part of a longer word of a title). Returns None if the search has no such trigram (words under 3 characters)
+    def substring_candidates(self, query):
+        grams = {word[i:i + 3] for word in query.casefold().split() for i in range(len(word) - 2)}
+        if not grams:
+            return None
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    # Returns up to limit titles similar to a search, most similar first
+    def search(self, query, limit=10):
+        query_grams = trigrams(query)
+
+        # Candidates share at least one (not too common) trigram with the search
+        candidates = Counter()
+        for gram in query_grams:
+            postings = self._postings.get(gram, ())
+            if len(postings) <= MAX_POSTINGS:
+                candidates.update(postings)
+
+        scored = []
+        for title in candidates:
+            score = similarity(query_grams, self._trigrams[title])
+            if score >= SIMILARITY_THRESHOLD:
+                scored.append((score, title))
+        return [title for _, title in heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))]
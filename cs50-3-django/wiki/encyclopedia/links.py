@@ -0,0 +1,61 @@
+import hashlib
+import re
+from urllib.parse import unquote
+
+from django.db import transaction
+
+from .models import Link
+
+# Inline links ([text](/wiki/Title)) and reference definitions ([name]: /wiki/Title) to other entries
+LINK_RE = re.compile(r"\]\(\s*<?/wiki/([^)\s>#?]+)")
+REFERENCE_RE = re.compile(r"^ {0,3}\[[^\]]+\]:\s*<?/wiki/([^\s>#?]+)", re.MULTILINE)
+
+
+# Returns the titles an entry's markdown links to
+def extract_links(content):
+    targets = LINK_RE.findall(content) + REFERENCE_RE.findall(content)
+    return {unquote(target) for target in targets}
+
+
+# Replaces the outgoing links of an entry (only the saved entry's links are touched)
+@transaction.atomic
+def update_links(title, content):
+    Link.objects.filter(source=title).delete()
+    Link.objects.bulk_create([
+        Link(source=title, target=target, target_key=target.casefold())
+        for target in sorted(extract_links(content))
+    ])
+
+
+# Removes the outgoing links of a deleted entry (links to it from other entries become broken links)
+def remove_links(title):
+    Link.objects.filter(source=title).delete()
+
+
+# Rebuilds every link from an iterable of (title, content) pairs
+@transaction.atomic
+def rebuild(entries):
+    Link.objects.all().delete()
+    for title, content in entries:
+        update_links(title, content)
+
+
+# Returns the titles of the entries linking to an entry, in alphabetical order
+def backlinks(title):
+    sources = Link.objects.filter(target_key=title.casefold()).exclude(source=title).values_list("source", flat=True)
+    return sorted(set(sources))
+
+
+# Returns a hash of the entries linking to an entry (changes whenever an entry starts or stops linking to it)
+def backlinks_fingerprint(title):
+    return hashlib.sha256("\n".join(backlinks(title)).encode("utf-8")).hexdigest()[:16]
+
+
+# Returns the (entry, linked title) pairs of links to entries that don't exist, given a function resolving titles
+# Every linked title is resolved in memory, then the links to the missing ones are fetched in a single query
+def broken_links(resolve_title):
+    target_keys = Link.objects.values_list("target_key", flat=True).distinct()
+    missing = [target_key for target_key in target_keys if resolve_title(target_key) is None]
+    if not missing:
+        return []
+    return sorted(Link.objects.filter(target_key__in=missing).values_list("source", "target"))
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+from encyclopedia import render
+
+from .bench_wiki import WORDS, generate, summarize
+
+
+# Compares the throughput of concurrent requests served through WSGI and ASGI on the same synthetic encyclopedia
+class Command(BaseCommand):
+    help = ("Compares concurrent-request latency and throughput through WSGI (sync views, one thread per request) "
+            "and ASGI (async views on an event loop) on a synthetic encyclopedia")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=1000, help="Number of synthetic entries")
+        parser.add_argument("--entry-size", type=int, default=2000, help="Approximate size of each entry in bytes")
+        parser.add_argument("--requests", type=int, default=500, help="Number of requests made to each page")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                            help="Numbers of requests in flight at once")
+        parser.add_argument("--seed", type=int, default=50, help="Seed of the random generator (for repeatable runs)")
+        parser.add_argument("--output", default="bench_asgi_results.json", help="JSON file the results are written to")
+
+    # Makes the requests through WSGI from a pool of concurrency threads (like a threaded WSGI server)
+    def measure_wsgi(self, requests, concurrency):
+        clients = threading.local()
+
+        def make_request(request):
+            if not hasattr(clients, "client"):
+                clients.client = Client()
+            method, path, data = request
+            request_start = time.perf_counter()
+            response = getattr(clients.client, method)(path, data)
+            if response.status_code >= 400:
+                raise RuntimeError(f"Request failed with status {response.status_code}")
+            return time.perf_counter() - request_start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(make_request, requests))
+        return summarize(latencies, time.perf_counter() - start)
+
+    # Makes the requests through ASGI on one event loop, with at most concurrency requests in flight
+    def measure_asgi(self, requests, concurrency):
+
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def make_request(request):
+                method, path, data = request
+                async with semaphore:
+                    request_start = time.perf_counter()
+                    response = await getattr(client, method)(path, data)
+                    if response.status_code >= 400:
+                        raise RuntimeError(f"Request failed with status {response.status_code}")
+                    return time.perf_counter() - request_start
+
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(make_request(request) for request in requests))
+            return summarize(latencies, time.perf_counter() - start)
+
+        return asyncio.run(run())
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        directory = tempfile.mkdtemp(prefix="wiki-bench-")
+
+        # The entries are indexed in a throwaway test database
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Page views aren't flushed by the background thread (see bench_wiki)
+            with override_settings(MEDIA_ROOT=directory, ALLOWED_HOSTS=["testserver"], WIKI_EXPORT_DIR=None,
+                                   WIKI_HTML_SPOOL_DIR=None, WIKI_VIEW_FLUSH_INTERVAL=0):
+                start = time.perf_counter()
+                titles = generate(directory, options["entries"], options["entry_size"], rng)
+                self.stdout.write(f"{len(titles)} entries generated in {time.perf_counter() - start:.1f}s")
+
+                # Both servers get the same requests
+                count = options["requests"]
+                pages = {
+                    "index": [("get", "/", None)] * count,
+                    "entry": [("get", f"/wiki/{rng.choice(titles)}", None) for _ in range(count)],
+                    "search": [("post", "/search", {"q": rng.choice(WORDS)}) for _ in range(count)],
+                    "random": [("get", "/random", None)] * count,
+                }
+
+                runs = []
+                for concurrency in options["concurrency"]:
+                    for server, measure in (("wsgi", self.measure_wsgi), ("asgi", self.measure_asgi)):
+                        results = {}
+                        for page, requests in pages.items():
+                            render.clear_caches()
+                            results[page] = measure(requests, concurrency)
+                            result = results[page]
+                            self.stdout.write(f"{server}  concurrency {concurrency:>4}  {page:<8} "
+                                              f"p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                                              f"{result['requests_per_second']:8.1f} req/s")
+                        runs.append({"server": server, "concurrency": concurrency, "pages": results})
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump({
+                "entries": options["entries"],
+                "entry_size": options["entry_size"],
+                "requests": options["requests"],
+                "seed": options["seed"],
+                "runs": runs,
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,40 @@
+import time
+
+import markdown
+from django.core.management.base import BaseCommand
+
+from encyclopedia import render, util
+
+
+# Measures markdown conversions per second with a new converter per call and with the reused per-thread converter
+class Command(BaseCommand):
+    help = "Measures markdown conversions per second with a new converter per call and with the reused per-thread converter"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=2.0, help="How long to run each benchmark")
+
+    # Returns the number of conversions per second made by a function over a list of markdown texts
+    def measure(self, convert, texts, seconds):
+        conversions = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            for text in texts:
+                convert(text)
+            conversions += len(texts)
+        return conversions / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        texts = [util.get_entry(title) for title in util.list_entries()]
+        if not texts:
+            self.stderr.write("There are no entries to convert")
+            return
+
+        # Before - a new converter is built for every conversion
+        before = self.measure(lambda text: markdown.Markdown(**render.markdown_options()).convert(text),
+                              texts, options["seconds"])
+        # After - this thread's converter is reset and reused
+        after = self.measure(render.convert, texts, options["seconds"])
+
+        self.stdout.write(f"New converter per call:  {before:10.1f} conversions/s")
+        self.stdout.write(f"Reused thread converter: {after:10.1f} conversions/s")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {after / before:.2f}x over {len(texts)} entries"))
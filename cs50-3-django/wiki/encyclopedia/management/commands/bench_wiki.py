@@ -0,0 +1,143 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from encyclopedia import links, render, search_index
+
+WORDS = ("alpha beta gamma delta epsilon zeta theta kappa lambda sigma omega python django html css git "
+         "markdown wiki entry search index cache page link title render storage query latency").split()
+
+
+# Returns the markdown of a synthetic entry of about size bytes (a heading, paragraphs and links to other entries)
+def synthetic_entry(rng, title, titles, size):
+    lines = [f"# {title}", ""]
+    length = len(title) + 3
+    while length < size:
+        words = rng.choices(WORDS, k=12)
+        words.append(f"[{rng.choice(titles)}](/wiki/{rng.choice(titles)})")
+        line = " ".join(words) + "."
+        lines.extend([line, ""])
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+# Generates count synthetic entries in an entries/ directory of directory, fills the indexes and returns their titles
+def generate(directory, count, entry_size, rng):
+    os.makedirs(os.path.join(directory, "entries"))
+    titles = [f"Entry{i:06d}" for i in range(count)]
+    entries = []
+    for title in titles:
+        content = synthetic_entry(rng, title, titles, entry_size)
+        with open(os.path.join(directory, "entries", f"{title}.md"), "w", encoding="utf-8") as f:
+            f.write(content)
+        entries.append((title, content))
+    search_index.rebuild(entries)
+    links.rebuild(entries)
+    return titles
+
+
+# Returns the 50th, 95th and 99th percentile and mean of latencies (in milliseconds) and the throughput
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "requests_per_second": len(latencies) / elapsed,
+    }
+
+
+# Measures the latency and throughput of the wiki's pages as the number of entries grows
+class Command(BaseCommand):
+    help = "Measures the latency and throughput of the wiki's pages on synthetic encyclopedias of growing size"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                            help="Numbers of synthetic entries to measure with")
+        parser.add_argument("--entry-size", type=int, default=2000, help="Approximate size of each entry in bytes")
+        parser.add_argument("--requests", type=int, default=200, help="Number of requests made to each page")
+        parser.add_argument("--seed", type=int, default=50, help="Seed of the random generator (for repeatable runs)")
+        parser.add_argument("--output", default="bench_results.json", help="JSON file the results are written to")
+
+    # Makes requests to a page and returns their latencies (make_request is called with the request number)
+    def measure(self, make_request, count):
+        latencies = []
+        start = time.perf_counter()
+        for i in range(count):
+            request_start = time.perf_counter()
+            response = make_request(i)
+            if response.status_code >= 400:
+                raise RuntimeError(f"Request failed with status {response.status_code}")
+            if response.streaming:
+                b"".join(response.streaming_content)
+            latencies.append(time.perf_counter() - request_start)
+        return summarize(latencies, time.perf_counter() - start)
+
+    # Measures every page on an encyclopedia of count entries
+    def run(self, count, options, rng):
+        directory = tempfile.mkdtemp(prefix="wiki-bench-")
+        try:
+            # Page views aren't flushed by the background thread, which would write them outside the rolled back
+            # transaction through its own connection
+            with override_settings(MEDIA_ROOT=directory, ALLOWED_HOSTS=["testserver"], WIKI_EXPORT_DIR=None,
+                                   WIKI_HTML_SPOOL_DIR=os.path.join(directory, "html_spool"),
+                                   WIKI_VIEW_FLUSH_INTERVAL=0):
+
+                # Everything written to the database is rolled back once the run is over
+                with transaction.atomic():
+                    start = time.perf_counter()
+                    titles = generate(directory, count, options["entry_size"], rng)
+                    self.stdout.write(f"{count} entries generated in {time.perf_counter() - start:.1f}s")
+                    render.clear_caches()
+
+                    client = Client()
+                    requests = options["requests"]
+                    results = {
+                        "index": self.measure(lambda i: client.get("/"), requests),
+                        "entry": self.measure(lambda i: client.get(f"/wiki/{rng.choice(titles)}"), requests),
+                        "search": self.measure(lambda i: client.post("/search", {"q": rng.choice(WORDS)}), requests),
+                        "random": self.measure(lambda i: client.get("/random"), requests),
+                        "create": self.measure(lambda i: client.post("/create", {
+                            "title": f"New{i:06d}",
+                            "content": synthetic_entry(rng, f"New{i:06d}", titles, options["entry_size"])
+                        }), requests),
+                        "save_edit": self.measure(lambda i: client.post("/save_edit", {
+                            "title": titles[i % len(titles)],
+                            "content": synthetic_entry(rng, titles[i % len(titles)], titles, options["entry_size"])
+                        }), requests),
+                    }
+                    transaction.set_rollback(True)
+            return results
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        runs = []
+        for count in options["sizes"]:
+            results = self.run(count, options, rng)
+            runs.append({"entries": count, "pages": results})
+            for page, result in results.items():
+                self.stdout.write(f"{count:>8} entries  {page:<10} p50 {result['p50_ms']:8.2f}ms  "
+                                  f"p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  "
+                                  f"{result['requests_per_second']:8.1f} req/s")
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump({
+                "entry_size": options["entry_size"],
+                "requests": options["requests"],
+                "seed": options["seed"],
+                "runs": runs,
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
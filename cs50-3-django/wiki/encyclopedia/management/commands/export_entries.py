@@ -0,0 +1,42 @@
+import io
+import sys
+import tarfile
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import util
+
+
+# Writes every encyclopedia entry as <title>.md into a tar archive
+class Command(BaseCommand):
+    help = "Writes every encyclopedia entry as <title>.md into a tar archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Tar archive to write (compressed with gzip if it ends in .gz, - for stdout)")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        mode = "w|gz" if output.endswith(".gz") else "w|"
+
+        # The archive is written as a stream, one entry at a time
+        fileobj = sys.stdout.buffer if output == "-" else open(output, "wb")
+        count = 0
+        try:
+            with tarfile.open(fileobj=fileobj, mode=mode) as archive:
+                store = util.get_store()
+                for title in util.list_entries():
+                    content = store.get_entry(title)
+                    if content is None:
+                        continue
+                    data = content.encode("utf-8")
+                    info = tarfile.TarInfo(f"{title}.md")
+                    info.size = len(data)
+                    info.mtime = int(store.modified(title) or 0)
+                    archive.addfile(info, io.BytesIO(data))
+                    count += 1
+        finally:
+            if fileobj is not sys.stdout.buffer:
+                fileobj.close()
+
+        if output != "-":
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} entries into {output}"))
@@ -0,0 +1,24 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from encyclopedia import export
+
+
+# Renders every encyclopedia entry (and the homepage) into a directory of static html pages
+class Command(BaseCommand):
+    help = "Renders every encyclopedia entry (and the homepage) into a directory of static html pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=None,
+                            help="Directory to export into (defaults to WIKI_EXPORT_DIR, or export/ next to manage.py)")
+        parser.add_argument("--full", action="store_true",
+                            help="Re-render every entry instead of only the entries changed since the last export")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Number of worker processes rendering pages (defaults to the number of CPUs)")
+
+    def handle(self, *args, **options):
+        directory = options["output"] or getattr(settings, "WIKI_EXPORT_DIR", None) or os.path.join(settings.BASE_DIR, "export")
+        count = export.export_wiki(directory, full=options["full"], workers=options["workers"])
+        self.stdout.write(self.style.SUCCESS(f"Exported {directory} ({count} entries changed since the last export)"))
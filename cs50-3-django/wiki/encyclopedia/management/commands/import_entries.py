@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from encyclopedia import render, util
+
+
+# Yields the (title, content) of every .md file in a directory and its subdirectories (the title is the file name
+# without .md), in a stable order
+def read_directory(path):
+    for directory, subdirectories, filenames in os.walk(path):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".md"):
+                with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                    yield filename[:-3], f.read()
+
+
+# Yields the (title, content) of every .md file in a tar archive, reading the archive as a stream
+def read_archive(path):
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            name = os.path.basename(member.name)
+            if member.isfile() and name.endswith(".md"):
+                yield name[:-3], archive.extractfile(member).read().decode("utf-8")
+
+
+# Yields the (title, content) of the entries whose title wasn't yielded before, adding the titles of the others (files
+# with the same name in another directory) to duplicates
+def unique_titles(entries, duplicates):
+    seen = set()
+    for title, content in entries:
+        if title in seen:
+            duplicates.append(title)
+            continue
+        seen.add(title)
+        yield title, content
+
+
+# Yields the items of an iterable in lists of at most size items
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Imports every .md file of a directory or tar archive as an encyclopedia entry
+class Command(BaseCommand):
+    help = "Imports every .md file of a directory or tar archive as an encyclopedia entry"
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory or tar archive (optionally compressed) of .md files")
+        parser.add_argument("--batch-size", type=int, default=200, help="Number of entries written per batch")
+        parser.add_argument("--workers", type=int, default=8, help="Number of threads writing entries")
+        parser.add_argument("--no-warm", action="store_true",
+                            help="Don't render the imported entries into the html cache")
+
+    # Writes one entry (run in a worker thread), unless its content is unchanged
+    # Returns whether the entry was new, or None if it was skipped
+    def write(self, title, content, warm):
+        if util.entry_hash(title) == hashlib.sha256(content.encode("utf-8")).hexdigest():
+            return None
+        created = util.write_entry(title, content)
+        if warm:
+            render.md_to_html(content, title)
+        return created
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        if os.path.isdir(source):
+            entries = read_directory(source)
+        elif tarfile.is_tarfile(source):
+            entries = read_archive(source)
+        else:
+            raise CommandError(f"{source} is neither a directory nor a tar archive")
+
+        # Only the first file with each title is imported (entries can't be told apart by their directory)
+        duplicates = []
+        entries = unique_titles(entries, duplicates)
+
+        imported = skipped = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for batch in batches(entries, options["batch_size"]):
+                results = executor.map(lambda entry: self.write(*entry, not options["no_warm"]), batch)
+
+                # Updates the search index for the whole batch in one transaction
+                with transaction.atomic():
+                    for (title, content), created in zip(batch, results):
+                        if created is None:
+                            skipped += 1
+                        else:
+                            util.index_entry(title, content, created)
+                            imported += 1
+                self.stdout.write(f"{imported} entries imported, {skipped} unchanged")
+
+        for title in duplicates:
+            self.stderr.write(f"Skipped another file named {title}.md (an entry can only be imported once)")
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} entries ({skipped} unchanged entries skipped)"))
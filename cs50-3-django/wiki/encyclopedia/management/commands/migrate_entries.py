@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from encyclopedia.stores import FileSystemEntryStore, RevisionEntryStore, SQLiteEntryStore
+
+
+# Copies every entries/<title>.md file into an SQLite entry store (or a revision store)
+class Command(BaseCommand):
+    help = "Copies every entries/<title>.md file into an SQLite entry store (or a revision store)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--store", choices=["sqlite", "revisions"], default="sqlite",
+                            help="Kind of entry store to copy the entries into")
+        parser.add_argument("--path", default=None,
+                            help="SQLite database to copy the entries into (defaults to the PATH option of WIKI_ENTRY_STORE, "
+                                 "or entries.sqlite3 next to manage.py)")
+        parser.add_argument("--delete", action="store_true",
+                            help="Delete each markdown file once it has been copied")
+
+    def handle(self, *args, **options):
+        source = FileSystemEntryStore()
+        if options["store"] == "revisions":
+            destination = RevisionEntryStore()
+            path = destination.directory
+        else:
+            path = options["path"] or getattr(settings, "WIKI_ENTRY_STORE", {}).get("OPTIONS", {}).get(
+                "PATH", os.path.join(settings.BASE_DIR, "entries.sqlite3"))
+            destination = SQLiteEntryStore(path)
+
+        titles = sorted(source.list_entries())
+        for title in titles:
+            destination.save_entry(title, source.get_entry(title))
+            if options["delete"]:
+                source.delete_entry(title)
+
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(titles)} entries into {path}"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import links, util
+
+
+# Rebuilds the links between entries (used for "what links here" and broken links) from every encyclopedia entry
+class Command(BaseCommand):
+    help = "Rebuilds the links between entries (used for \"what links here\" and broken links) from every encyclopedia entry"
+
+    def handle(self, *args, **options):
+        titles = util.list_entries()
+        links.rebuild((title, util.get_entry(title)) for title in titles)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the links of {len(titles)} entries"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import outline, util
+from encyclopedia.render import md_to_html
+
+
+# Rebuilds the outline (used for the table of contents) of every encyclopedia entry
+class Command(BaseCommand):
+    help = "Rebuilds the outline (used for the table of contents) of every encyclopedia entry"
+
+    def handle(self, *args, **options):
+        titles = util.list_entries()
+        outline.rebuild((title, md_to_html(util.get_entry(title), title)) for title in titles)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the outlines of {len(titles)} entries"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import search_index, util
+
+
+# Rebuilds the full-text search index from every encyclopedia entry
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index from every encyclopedia entry"
+
+    def handle(self, *args, **options):
+        titles = util.list_entries()
+        search_index.rebuild((title, util.get_entry(title)) for title in titles)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(titles)} entries"))
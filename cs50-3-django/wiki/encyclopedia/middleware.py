@@ -0,0 +1,25 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.decorators import sync_and_async_middleware
+
+
+# Routes requests served through ASGI to the URLconf set by WIKI_ASGI_URLCONF (the async views), while requests
+# served through WSGI keep using ROOT_URLCONF (the sync views)
+@sync_and_async_middleware
+def asgi_urlconf_middleware(get_response):
+
+    def set_urlconf(request):
+        urlconf = getattr(settings, "WIKI_ASGI_URLCONF", None)
+        if urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = urlconf
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            set_urlconf(request)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            set_urlconf(request)
+            return get_response(request)
+    return middleware
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, unique=True)),
+                ('length', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndexStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_count', models.IntegerField(default=0)),
+                ('token_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Posting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('frequency', models.IntegerField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='encyclopedia.indexedentry')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='encyclopedi_term_b46e20_idx')],
+                'constraints': [models.UniqueConstraint(fields=('entry', 'term'), name='unique_posting')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Link',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('target', models.CharField(max_length=255)),
+                ('target_key', models.CharField(max_length=255)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source'], name='encyclopedi_source_5914dd_idx'), models.Index(fields=['target_key'], name='encyclopedi_target__ba4e86_idx')],
+            },
+        ),
+    ]
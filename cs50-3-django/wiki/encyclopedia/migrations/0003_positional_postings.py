@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0002_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexedentry',
+            name='text',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='positions',
+            field=models.TextField(default=''),
+        ),
+    ]
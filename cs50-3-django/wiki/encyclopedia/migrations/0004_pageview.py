@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0003_positional_postings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageView',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, unique=True)),
+                ('views', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-views'], name='encyclopedi_views_2010b7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0004_pageview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outline',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, unique=True)),
+                ('headings', models.JSONField(default=list)),
+            ],
+        ),
+    ]
@@ -1,3 +1,82 @@
 from django.db import models
 
-# Create your models here.
+
+# Model for entries in the full-text search index (entry title, number of indexed tokens in the entry, plain text of
+# the entry that search result snippets are cut from)
+class IndexedEntry(models.Model):
+    title = models.CharField(max_length=255, unique=True)
+    length = models.IntegerField(default=0)
+    text = models.TextField(default="")
+
+    def __str__(self):
+        return self.title
+
+
+# Model for the postings of the full-text search index (token, entry containing the token, term frequency of the token in the entry,
+# space-separated offsets of the token in the entry's plain text)
+class Posting(models.Model):
+    term = models.CharField(max_length=100)
+    entry = models.ForeignKey(IndexedEntry, on_delete=models.CASCADE, related_name="postings")
+    frequency = models.IntegerField()
+    positions = models.TextField(default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["entry", "term"], name="unique_posting"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} appears {self.frequency} times in {self.entry}"
+
+
+# Model for the totals of the full-text search index (number of indexed entries, total number of indexed tokens)
+# Kept as a single row so BM25 ranking doesn't need to aggregate over every entry on each search
+class IndexStatistics(models.Model):
+    entry_count = models.IntegerField(default=0)
+    token_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.entry_count} entries, {self.token_count} tokens"
+
+
+# Model for links between entries (entry containing the link, linked title as written, case-folded linked title)
+# Rows are replaced whenever the linking entry is saved, so "what links here" and broken links never need a rescan
+class Link(models.Model):
+    source = models.CharField(max_length=255)
+    target = models.CharField(max_length=255)
+    target_key = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["source"]),
+            models.Index(fields=["target_key"]),
+        ]
+
+    def __str__(self):
+        return f"{self.source} links to {self.target}"
+
+
+# Model for the number of times each entry's page was viewed (counted in memory and added in batches, see popularity.py)
+class PageView(models.Model):
+    title = models.CharField(max_length=255, unique=True)
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-views"]),
+        ]
+
+    def __str__(self):
+        return f"{self.title} viewed {self.views} times"
+
+
+# Model for the outline of each entry (a [level, text, anchor] list for every heading), stored when the entry is saved
+class Outline(models.Model):
+    title = models.CharField(max_length=255, unique=True)
+    headings = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Outline of {self.title}"
@@ -0,0 +1,91 @@
+import html
+import re
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .models import Outline
+
+# Headings in rendered html: without attributes by default (e.g. <h2>Syntax</h2>), with an id when the toc extension
+# is enabled (e.g. <h2 id="syntax">Syntax<a class="headerlink" href="#syntax">&para;</a></h2>)
+HEADING_RE = re.compile(r"<h([1-6])(\s[^>]*)?>(.*?)</h\1>", re.DOTALL)
+ID_RE = re.compile(r'\sid="([^"]*)"')
+HEADERLINK_RE = re.compile(r'<a class="headerlink"[^>]*>.*?</a>', re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+# Yields the match, level, text and anchor of every heading of an entry's html, in order
+# A heading's anchor is its id if it has one (set by the toc extension). Otherwise anchors are slugs of the heading text,
+# numbered if several headings have the same slug ("usage", "usage-2"...)
+def headings(html_content):
+    seen = {}
+    for match in HEADING_RE.finditer(html_content):
+        text = html.unescape(TAG_RE.sub("", HEADERLINK_RE.sub("", match.group(3)))).strip()
+        heading_id = ID_RE.search(match.group(2) or "")
+        if heading_id:
+            anchor = html.unescape(heading_id.group(1))
+            seen[anchor] = seen.get(anchor, 0) + 1
+        else:
+            slug = slugify(text) or "section"
+            seen[slug] = seen.get(slug, 0) + 1
+            anchor = slug if seen[slug] == 1 else f"{slug}-{seen[slug]}"
+        yield match, int(match.group(1)), text, anchor
+
+
+# Returns the outline of an entry's html: a [level, text, anchor] list for every heading
+def extract_outline(html_content):
+    return [[level, text, anchor] for _, level, text, anchor in headings(html_content)]
+
+
+# Returns an entry's html with an id on every heading, so the table of contents can link to each section (headings
+# which already have an id are kept as they are)
+def add_anchors(html_content):
+    parts = []
+    end = 0
+    for match, level, _, anchor in headings(html_content):
+        parts.append(html_content[end:match.start()])
+        attributes = match.group(2) or ""
+        if ID_RE.search(attributes):
+            parts.append(match.group(0))
+        else:
+            parts.append(f'<h{level} id="{anchor}"{attributes}>{match.group(3)}</h{level}>')
+        end = match.end()
+    parts.append(html_content[end:])
+    return "".join(parts)
+
+
+# Returns the html of one section of an entry (its heading and everything up to the next heading of the same or a
+# higher level), or None if the entry has no such section
+def section(html_content, anchor):
+    start = section_level = None
+    for match, level, _, heading_anchor in headings(html_content):
+        if start is not None and level <= section_level:
+            return html_content[start:match.start()].strip()
+        if start is None and heading_anchor == anchor:
+            start, section_level = match.start(), level
+    return html_content[start:].strip() if start is not None else None
+
+
+# Stores the outline of an entry when it is saved, so pages can show a table of contents without parsing the entry
+def update_outline(title, html_content):
+    Outline.objects.update_or_create(title=title, defaults={"headings": extract_outline(html_content)})
+
+
+# Removes the outline of a deleted entry
+def remove_outline(title):
+    Outline.objects.filter(title=title).delete()
+
+
+# Returns the stored outline of an entry (empty if the entry has no headings or no stored outline)
+def get_outline(title):
+    return Outline.objects.filter(title=title).values_list("headings", flat=True).first() or []
+
+
+# Rebuilds every outline from an iterable of (title, html) pairs
+@transaction.atomic
+def rebuild(entries):
+    Outline.objects.all().delete()
+    Outline.objects.bulk_create([
+        Outline(title=title, headings=extract_outline(html_content))
+        for title, html_content in entries
+    ])
@@ -0,0 +1,62 @@
+import threading
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import PageView
+
+# Page views counted since the last flush (title -> views), shared by every thread of this process
+# Views not flushed yet when the process exits are lost (at most WIKI_VIEW_FLUSH_INTERVAL seconds of views)
+_buffer = Counter()
+_buffer_lock = threading.Lock()
+
+
+# Counts a view of an entry's page in memory (the views are added to the database by flush)
+def record_view(title):
+    with _buffer_lock:
+        _buffer[title] += 1
+
+
+# Adds the buffered views to the database in a few bulk queries
+# Views are added with F() expressions, so processes flushing at the same time don't overwrite each other's counts
+# If the database can't be updated, the views are put back in the buffer for the next flush
+def flush():
+    with _buffer_lock:
+        counts = dict(_buffer)
+        _buffer.clear()
+    if not counts:
+        return
+
+    try:
+        with transaction.atomic():
+            PageView.objects.bulk_create([PageView(title=title) for title in counts], ignore_conflicts=True)
+            rows = list(PageView.objects.filter(title__in=counts))
+            for row in rows:
+                row.views = F("views") + counts[row.title]
+            PageView.objects.bulk_update(rows, ["views"])
+    except Exception:
+        with _buffer_lock:
+            _buffer.update(counts)
+        raise
+
+
+# Returns the (title, views) of up to limit most viewed entries, most viewed first (including views not flushed yet)
+def most_viewed(limit=50):
+    with _buffer_lock:
+        buffered = Counter(_buffer)
+    views = Counter(dict(PageView.objects.order_by("-views", "title").values_list("title", "views")[:limit]))
+    views.update(buffered)
+    return sorted(views.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+# Returns the titles of the most viewed entries (used to render or export hot entries first)
+def hot_entries(limit=50):
+    return [title for title, _ in most_viewed(limit)]
+
+
+# Forgets the views of a deleted entry
+def remove_entry(title):
+    with _buffer_lock:
+        _buffer.pop(title, None)
+    PageView.objects.filter(title=title).delete()
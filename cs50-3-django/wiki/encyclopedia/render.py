@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import markdown
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import compression, outline
+
+# Name of the cache (see CACHES in settings.py) holding the rendered html of encyclopedia entries
+CACHE_ALIAS = "markdown"
+
+# Name of the cache holding the html of the top-level blocks of entries (see convert_blocks), kept apart from the
+# entries' html so the blocks of a long entry never evict other entries' html
+BLOCK_CACHE_ALIAS = "markdown_blocks"
+
+# Name of the cache holding entries' html compressed with each content encoding (see compressed_html), also kept apart
+# from the entries' html
+COMPRESSED_CACHE_ALIAS = "markdown_compressed"
+
+# Name of the cache holding small records about entries (which html belongs to each title, see title_key, and the hash
+# of each entry's content, see util.entry_hash), kept apart so the rendered html cache only holds html
+META_CACHE_ALIAS = "markdown_meta"
+
+# Hit/miss/eviction counters for the rendered html cache, and hit/miss counters for the block and compressed html caches
+# (counted per process)
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_other_stats = {"blocks": {"hits": 0, "misses": 0}, "compressed": {"hits": 0, "misses": 0}}
+_stats_lock = threading.Lock()
+
+# Keys this process has stored in the cache, so a miss on one of them can be counted as an eviction
+_stored_keys = OrderedDict()
+
+# Markdown converters are reused by each thread (building one registers every extension, preprocessor and pattern)
+_converters = threading.local()
+
+# Incremented when the WIKI_MARKDOWN setting changes, so every thread builds a new converter
+_converter_generation = 0
+
+# Fingerprint of the markdown options (part of every cache key, so html rendered with other options is never served)
+_fingerprint = None
+
+
+# Returns the markdown extensions and extension configs set by the WIKI_MARKDOWN setting
+def markdown_options():
+    options = getattr(settings, "WIKI_MARKDOWN", {})
+    return {
+        "extensions": options.get("EXTENSIONS", []),
+        "extension_configs": options.get("EXTENSION_CONFIGS", {}),
+    }
+
+
+# Returns the fingerprint of the markdown options
+def options_fingerprint():
+    global _fingerprint
+    if _fingerprint is None:
+        options = json.dumps(markdown_options(), sort_keys=True, default=str)
+        _fingerprint = hashlib.sha256(options.encode("utf-8")).hexdigest()[:16]
+    return _fingerprint
+
+
+# Forgets every thread's converter when the markdown options change (e.g. in tests using override_settings)
+@receiver(setting_changed)
+def _reset_converters(setting, **kwargs):
+    global _converter_generation, _fingerprint
+    if setting == "WIKI_MARKDOWN":
+        _converter_generation += 1
+        _fingerprint = None
+
+
+# Returns this thread's markdown converter (built on first use)
+def get_converter():
+    if getattr(_converters, "generation", None) != _converter_generation:
+        _converters.markdown = markdown.Markdown(**markdown_options())
+        _converters.generation = _converter_generation
+    return _converters.markdown
+
+
+# Converts markdown to html with this thread's converter (without using the cache)
+def convert(md_content):
+    converter = get_converter()
+    try:
+        return converter.convert(md_content)
+    finally:
+        converter.reset()
+
+
+# Markdown extensions that never make one top-level block's html depend on another block
+# (e.g. toc numbers duplicate heading ids across the whole document, footnotes collect definitions from every block)
+BLOCK_SAFE_EXTENSIONS = {"tables", "fenced_code", "nl2br", "sane_lists",
+                         "markdown.extensions.tables", "markdown.extensions.fenced_code",
+                         "markdown.extensions.nl2br", "markdown.extensions.sane_lists"}
+
+# Lines that can't start a new block because they may continue the previous one (indented lines, list items and
+# blockquotes separated by blank lines still belong to the same list, code block or quote)
+CONTINUATION_RE = re.compile(r"^(\s|[*+-]\s|\d+[.)]\s|>)")
+
+# Markdown whose html depends on other parts of the document (reference link definitions and raw html blocks, which
+# may contain blank lines), so it is always rendered as a whole
+WHOLE_DOCUMENT_RE = re.compile(r"^( {0,3}\[[^\]]+\]:|\s{0,3}<)", re.MULTILINE)
+
+# Opening fence of fenced code, as the fenced_code extension matches it (at the start of the line). The code only ends
+# at a line holding exactly the same fence, optionally followed by spaces
+FENCE_RE = re.compile(r"^(`{3,}|~{3,})")
+
+
+# Splits markdown into top-level blocks that render independently: the html of the whole document is the html of
+# each block joined by newlines. Returns None if the markdown can't be split safely (it is then rendered as a whole)
+def split_blocks(md_content):
+    extensions = markdown_options()["extensions"]
+    if any(not isinstance(extension, str) or extension not in BLOCK_SAFE_EXTENSIONS for extension in extensions):
+        return None
+    if WHOLE_DOCUMENT_RE.search(md_content):
+        return None
+
+    blocks = []
+    lines = []
+    blank_lines = []
+    fence = None
+    for line in md_content.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+
+        # Lines inside fenced code (even blank ones) never start a new block
+        if fence is not None:
+            lines.append(line)
+            if line.rstrip(" ") == fence:
+                fence = None
+            continue
+
+        if not line.strip():
+            blank_lines.append(line)
+            continue
+
+        # A line after blank lines starts a new block, unless it may continue the previous block
+        if blank_lines and lines and not CONTINUATION_RE.match(line):
+            blocks.append("\n".join(lines))
+            lines = []
+        else:
+            lines.extend(blank_lines)
+        blank_lines = []
+        lines.append(line)
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+
+    if lines:
+        blocks.append("\n".join(lines))
+    return blocks
+
+
+# Converts markdown to html block by block, reusing the cached html of blocks that were already rendered
+# (so a small edit to a long entry only renders the changed blocks)
+def convert_blocks(blocks):
+    cache = get_block_cache()
+    keys = [cache_key(block, "block") for block in blocks]
+    cached = cache.get_many(keys)
+    rendered = {}
+    for key, block in zip(keys, blocks):
+        if key not in cached and key not in rendered:
+            rendered[key] = convert(block)
+    if rendered:
+        cache.set_many(rendered)
+    _count("blocks", len(cached), len(rendered))
+    html_blocks = (cached.get(key, rendered.get(key)) for key in keys)
+    return "\n".join(html for html in html_blocks if html)
+
+
+# Returns the cache holding the rendered html of encyclopedia entries
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+# Returns the cache holding the html of the top-level blocks of entries
+def get_block_cache():
+    return caches[BLOCK_CACHE_ALIAS]
+
+
+# Returns the cache holding entries' compressed html
+def get_compressed_cache():
+    return caches[COMPRESSED_CACHE_ALIAS]
+
+
+# Returns the cache holding the title and content hash records of entries
+def get_meta_cache():
+    return caches[META_CACHE_ALIAS]
+
+
+# Empties the rendered html cache, the block cache, the compressed html cache and the entry records
+def clear_caches():
+    get_cache().clear()
+    get_block_cache().clear()
+    get_compressed_cache().clear()
+    get_meta_cache().clear()
+
+
+# Adds hits and misses to the counters of the block or compressed html cache
+def _count(name, hits, misses):
+    with _stats_lock:
+        _other_stats[name]["hits"] += hits
+        _other_stats[name]["misses"] += misses
+
+
+# Returns the maximum number of items a cache (the rendered html cache by default) keeps before evicting the least
+# recently used ones
+def max_entries(alias=CACHE_ALIAS):
+    options = settings.CACHES[alias].get("OPTIONS", {})
+    return options.get("MAX_ENTRIES", 300)
+
+
+# Returns the cache key for the html of some markdown content (keyed by a hash of the markdown source and options)
+def cache_key(md_content, prefix="html"):
+    return f"{prefix}:{options_fingerprint()}:" + hashlib.sha256(md_content.encode("utf-8")).hexdigest()
+
+
+# Returns the cache key remembering which html cache key belongs to an entry title
+def title_key(title):
+    return "title:" + hashlib.sha256(title.encode("utf-8")).hexdigest()
+
+
+# Remembers (or forgets) that this process stored a key in the cache
+def _remember_key(key):
+    _stored_keys[key] = True
+    _stored_keys.move_to_end(key)
+    while len(_stored_keys) > 10 * max_entries():
+        _stored_keys.popitem(last=False)
+
+
+# Converts markdown content to html, reusing the cached html if the same markdown has already been rendered
+def md_to_html(md_content, title=None):
+    cache = get_cache()
+    key = cache_key(md_content)
+    html_content = cache.get(key)
+
+    # Cache miss - renders the markdown and stores the html in the cache
+    if html_content is None:
+        with _stats_lock:
+            _stats["misses"] += 1
+            if _stored_keys.pop(key, None):
+                _stats["evictions"] += 1
+            _remember_key(key)
+        blocks = split_blocks(md_content)
+        html_content = convert_blocks(blocks) if blocks is not None else convert(md_content)
+        cache.set(key, html_content)
+    else:
+        with _stats_lock:
+            _stats["hits"] += 1
+
+    # Remembers which html belongs to the entry so it can be invalidated when the entry changes
+    if title is not None:
+        get_meta_cache().set(title_key(title), key)
+    return html_content
+
+
+# Returns the cache key of the html compressed with a content encoding
+def compressed_key(key, encoding):
+    return f"{key}:{encoding}"
+
+
+# Returns the html of some markdown content compressed with a content encoding, along with the size of the html
+# The html is only compressed the first time it is requested with that encoding, then kept in the compressed html cache
+def compressed_html(md_content, encoding, title=None):
+    html_content = md_to_html(md_content, title)
+    key = compressed_key(cache_key(md_content), encoding)
+    cache = get_compressed_cache()
+    data = cache.get(key)
+    if data is None:
+        _count("compressed", 0, 1)
+        data = compression.compress(html_content.encode("utf-8"), encoding)
+        cache.set(key, data)
+    else:
+        _count("compressed", 1, 0)
+    return data, len(html_content.encode("utf-8"))
+
+
+# Removes the cached html of an entry (called when an entry is saved or deleted)
+def invalidate(title):
+    key = get_meta_cache().get(title_key(title))
+    if key is not None:
+        get_cache().delete(key)
+        get_meta_cache().delete(title_key(title))
+        get_compressed_cache().delete_many([compressed_key(key, encoding) for encoding in compression.available_encodings()])
+        with _stats_lock:
+            _stored_keys.pop(key, None)
+
+
+# Returns the hit/miss/eviction counters of the rendered html cache, and the hit/miss counters of the block and
+# compressed html caches
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["blocks"] = dict(_other_stats["blocks"])
+        stats["compressed"] = dict(_other_stats["compressed"])
+    for counters, alias in [(stats, CACHE_ALIAS), (stats["blocks"], BLOCK_CACHE_ALIAS),
+                            (stats["compressed"], COMPRESSED_CACHE_ALIAS)]:
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        counters["max_entries"] = max_entries(alias)
+    return stats
+
+
+# Returns the path of the file holding the html of an entry (named after the hash of its markdown content),
+# or None if no directory is set for these files (WIKI_HTML_SPOOL_DIR)
+def spooled_html_path(content_hash):
+    directory = getattr(settings, "WIKI_HTML_SPOOL_DIR", None)
+    if not directory:
+        return None
+    return os.path.join(directory, f"{options_fingerprint()}-{content_hash}.html")
+
+
+# Renders markdown into a file (unless it was already rendered) so it can later be streamed without loading it
+# The markdown is only loaded (with load_markdown) if the file doesn't exist yet. Returns the path of the file,
+# or None if no directory is set for these files
+def spool_html(content_hash, load_markdown):
+    path = spooled_html_path(content_hash)
+    if path is not None and not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(outline.add_anchors(convert(load_markdown())))
+        os.replace(temporary_path, path)
+    return path
+
+
+# Removes the html file of an entry's previous content
+def remove_spooled_html(content_hash):
+    path = spooled_html_path(content_hash)
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,182 @@
+import contextlib
+import difflib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+# fcntl is only available on POSIX systems. Elsewhere, writers are only serialized within this process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Append-only revision log of an entry, kept in a directory as:
+#   <title>.head         - number of committed revisions, time and size of the latest one (JSON, replaced atomically)
+#   <title>.idx          - one fixed-size record per revision: offset and length in its segment, size, time saved
+#   <title>.<n>.pack     - segment n: revisions n * SEGMENT_REVISIONS up to the next segment, each zlib-compressed
+# The first revision of each segment is stored in full and the others as deltas against the previous revision, so
+# reading any revision only reads its own segment, up to the revision, through the offsets in the index.
+# Saving appends a record to the segment and the index, then renames a new head file into place: readers only trust
+# what the head says is committed, so they never see a partly written revision and never wait for a writer.
+# A deleted entry's head is renamed to <title>.deleted, keeping its history if the entry is created again
+
+SEGMENT_REVISIONS = 16
+
+# Offset and length of the revision in its segment, size of the revision's markdown in bytes, time it was saved
+INDEX_RECORD = struct.Struct("<QIId")
+
+# Serializes writers to the same log within this process (flock serializes them across processes)
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+# Returns the delta turning one text into another: ["c", start, end] copies lines of the old text, ["i", lines]
+# inserts new lines
+def make_delta(old, new):
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            delta.append(["c", i1, i2])
+        elif j2 > j1:
+            delta.append(["i", new_lines[j1:j2]])
+    return delta
+
+
+# Applies a delta made by make_delta to the old text
+def apply_delta(old, delta):
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    for operation in delta:
+        if operation[0] == "c":
+            parts.extend(old_lines[operation[1]:operation[2]])
+        else:
+            parts.extend(operation[1])
+    return "".join(parts)
+
+
+class RevisionLog:
+
+    # Titles are used as file names, so titles containing path separators are rejected
+    def __init__(self, directory, title):
+        if "/" in title or os.sep in title or (os.altsep and os.altsep in title):
+            raise SuspiciousFileOperation(f"Entry title {title!r} contains a path separator")
+        self.directory = directory
+        self.title = title
+
+    # safe_join also rejects paths outside the directory (e.g. a title of "..")
+    def _path(self, suffix):
+        return safe_join(self.directory, f"{self.title}{suffix}")
+
+    def _segment_path(self, segment):
+        return self._path(f".{segment}.pack")
+
+    # Returns the committed head of the log (None if the entry doesn't exist), or of the deleted entry if deleted is True
+    def head(self, deleted=False):
+        try:
+            with open(self._path(".deleted" if deleted else ".head"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # Returns the index records (offset, length, size, time) of revisions start to end - 1
+    def _records(self, start, end):
+        with open(self._path(".idx"), "rb") as f:
+            f.seek(start * INDEX_RECORD.size)
+            data = f.read((end - start) * INDEX_RECORD.size)
+        return list(INDEX_RECORD.iter_unpack(data))
+
+    # Returns the (number, time saved, size in bytes) of every committed revision, oldest first
+    def history(self):
+        head = self.head()
+        if head is None:
+            return []
+        return [(number, saved, size) for number, (_, _, size, saved) in enumerate(self._records(0, head["revisions"]))]
+
+    # Returns the markdown of a revision (numbered from 0, the latest by default), or None if it isn't committed
+    def read(self, number=None):
+        head = self.head()
+        if head is None:
+            return None
+        if number is None:
+            number = head["revisions"] - 1
+        if not 0 <= number < head["revisions"]:
+            return None
+        return self._read_revision(number)
+
+    # Reads a committed revision: only its segment is read, from the segment's full text up to the revision
+    def _read_revision(self, number):
+        segment = number // SEGMENT_REVISIONS
+        records = self._records(segment * SEGMENT_REVISIONS, number + 1)
+        start = records[0][0]
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(start)
+            data = f.read(records[-1][0] + records[-1][1] - start)
+        text = None
+        for offset, length, _, _ in records:
+            payload = json.loads(zlib.decompress(data[offset - start:offset - start + length]))
+            text = payload if text is None else apply_delta(text, payload)
+        return text
+
+    # Holds the log's lock (shared by the threads of this process, and by other processes through flock)
+    @contextlib.contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with _locks_lock:
+            lock = _locks.setdefault(self._path(""), threading.Lock())
+        with lock, open(self._path(".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    # Appends a revision and commits it by replacing the head. Returns the revision's number
+    def append(self, content):
+        with self._locked():
+            head = self.head() or self.head(deleted=True)
+            number = head["revisions"] if head else 0
+            segment = number // SEGMENT_REVISIONS
+
+            # Revisions after the first of a segment are stored as deltas against the previous revision
+            if number % SEGMENT_REVISIONS:
+                payload = make_delta(self._read_revision(number - 1), content)
+                offset, length, _, _ = self._records(number - 1, number)[0]
+                end = offset + length
+            else:
+                payload = content
+                end = 0
+            record = zlib.compress(json.dumps(payload).encode("utf-8"))
+            saved = time.time()
+            size = len(content.encode("utf-8"))
+
+            # Anything after the committed revisions was left by an interrupted save, and is overwritten
+            with open(self._segment_path(segment), "ab") as f:
+                f.truncate(end)
+                f.write(record)
+            with open(self._path(".idx"), "ab") as f:
+                f.truncate(number * INDEX_RECORD.size)
+                f.write(INDEX_RECORD.pack(end, len(record), size, saved))
+
+            temporary_path = self._path(f".head.tmp{os.getpid()}-{threading.get_ident()}")
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump({"revisions": number + 1, "modified": saved, "size": size}, f)
+            os.replace(temporary_path, self._path(".head"))
+            try:
+                os.remove(self._path(".deleted"))
+            except FileNotFoundError:
+                pass
+        return number
+
+    # Deletes the entry, keeping its history
+    def delete(self):
+        with self._locked():
+            try:
+                os.replace(self._path(".head"), self._path(".deleted"))
+            except FileNotFoundError:
+                pass
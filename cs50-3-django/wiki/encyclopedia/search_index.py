@@ -0,0 +1,220 @@
+import bisect
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from .models import IndexedEntry, Posting, IndexStatistics
+
+# BM25 ranking parameters (term frequency saturation, document length normalization)
+K1 = 1.2
+B = 0.75
+
+# Tokens in an entry's title are counted this many times, so title matches rank above body matches
+TITLE_WEIGHT = 3
+
+# Weight of index terms that only start with a search term (e.g. "pyth" matching "python")
+PREFIX_WEIGHT = 0.5
+
+# Only the last search term is expanded to the index terms starting with it (the term still being typed), only if it
+# is at least MIN_PREFIX_LENGTH characters long, and to at most MAX_PREFIX_TERMS index terms, so short prefixes
+# never pull a large share of the postings into memory
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_TERMS = 50
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 100
+
+# Markdown markup removed from the plain text of entries (link and image targets, html tags, emphasis, headings, quotes...)
+LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+MARKUP_RE = re.compile(r"<[^>]+>|[#*`>|~]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Approximate length of search result snippets, and how much text is shown before the first highlighted match
+SNIPPET_LENGTH = 200
+SNIPPET_LEAD = 40
+
+
+# Splits text into lowercase word tokens
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+# Returns the term frequencies of an entry (title tokens are weighted above body tokens)
+def entry_terms(title, content):
+    terms = Counter(tokenize(content))
+    for term in tokenize(title):
+        terms[term] += TITLE_WEIGHT
+    return terms
+
+
+# Returns the plain text of an entry's markdown (the text shown in search result snippets)
+def plain_text(content):
+    text = MARKUP_RE.sub(" ", LINK_RE.sub(r"\1", content))
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+# Returns the offsets of each term in a plain text
+def term_positions(text):
+    positions = defaultdict(list)
+    for match in TOKEN_RE.finditer(text):
+        positions[match.group().lower()[:MAX_TERM_LENGTH]].append(match.start())
+    return positions
+
+
+# Returns the single row holding the totals of the search index
+def _statistics():
+    statistics, _ = IndexStatistics.objects.get_or_create(pk=1)
+    return statistics
+
+
+# Adds an entry to the search index, replacing the postings of any previous version of the entry
+@transaction.atomic
+def index_entry(title, content):
+    terms = entry_terms(title, content)
+    length = sum(terms.values())
+    text = plain_text(content)
+    positions = term_positions(text)
+
+    entry, created = IndexedEntry.objects.get_or_create(title=title)
+    old_length = entry.length
+    entry.length = length
+    entry.text = text
+    entry.save(update_fields=["length", "text"])
+
+    # Replaces the entry's postings
+    entry.postings.all().delete()
+    Posting.objects.bulk_create([
+        Posting(term=term, entry=entry, frequency=frequency,
+                positions=" ".join(str(position) for position in positions.get(term, [])))
+        for term, frequency in terms.items()
+    ])
+
+    # Updates the index totals used by the ranking
+    _statistics()
+    IndexStatistics.objects.filter(pk=1).update(
+        entry_count=F("entry_count") + (1 if created else 0),
+        token_count=F("token_count") + length - old_length
+    )
+
+
+# Removes an entry (and its postings) from the search index
+@transaction.atomic
+def remove_entry(title):
+    entry = IndexedEntry.objects.filter(title=title).first()
+    if entry is None:
+        return
+    _statistics()
+    IndexStatistics.objects.filter(pk=1).update(
+        entry_count=F("entry_count") - 1,
+        token_count=F("token_count") - entry.length
+    )
+    entry.delete()
+
+
+# Rebuilds the whole search index from an iterable of (title, content) pairs
+@transaction.atomic
+def rebuild(entries):
+    Posting.objects.all().delete()
+    IndexedEntry.objects.all().delete()
+    IndexStatistics.objects.all().delete()
+    for title, content in entries:
+        index_entry(title, content)
+
+
+# Returns the index terms a search query matches: every search term, and the index terms starting with the last one
+def expand_terms(query):
+    query_terms = tokenize(query)
+    terms = set(query_terms)
+    if query_terms and len(query_terms[-1]) >= MIN_PREFIX_LENGTH:
+        prefix = query_terms[-1]
+        terms.update(Posting.objects.filter(term__gt=prefix, term__lt=prefix + "\U0010ffff").order_by("term")
+                     .values_list("term", flat=True).distinct()[:MAX_PREFIX_TERMS])
+    return terms
+
+
+# Returns the titles of the entries matching a search query, best BM25 score first
+def search(query, limit=50):
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return []
+
+    statistics = _statistics()
+    if statistics.entry_count == 0:
+        return []
+    average_length = statistics.token_count / statistics.entry_count
+
+    # Gets the postings of every search term, and of the index terms starting with the last one
+    postings = defaultdict(list)
+    for term, title, length, frequency in Posting.objects.filter(term__in=expand_terms(query)).values_list(
+            "term", "entry__title", "entry__length", "frequency"):
+        postings[term].append((title, length, frequency))
+
+    # Scores each entry with BM25, summed over all matching index terms
+    scores = defaultdict(float)
+    for term, term_postings in postings.items():
+        weight = 1 if term in query_terms else PREFIX_WEIGHT
+        idf = math.log(1 + (statistics.entry_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+        for title, length, frequency in term_postings:
+            normalization = K1 * (1 - B + B * length / average_length)
+            scores[title] += weight * idf * frequency * (K1 + 1) / (frequency + normalization)
+
+    best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+    return [title for title, _ in best]
+
+
+# Returns the html of a snippet of text around the given term offsets, with the terms highlighted
+# The snippet starts shortly before the part of the text holding the most matches
+def highlight(text, positions):
+    best_start, best_count = positions[0], 0
+    for i, position in enumerate(positions):
+        count = bisect.bisect_left(positions, position + SNIPPET_LENGTH - SNIPPET_LEAD, i) - i
+        if count > best_count:
+            best_start, best_count = position, count
+
+    # Cuts the snippet at word boundaries
+    start = max(0, best_start - SNIPPET_LEAD)
+    if start > 0:
+        start = text.find(" ", start, best_start) + 1 or best_start
+    end = min(len(text), start + SNIPPET_LENGTH)
+    if end < len(text):
+        space = text.rfind(" ", best_start, end)
+        if space > best_start:
+            end = space
+
+    parts = ["…"] if start > 0 else []
+    offset = start
+    for position in positions:
+        if position < offset or position >= end:
+            continue
+        match = TOKEN_RE.match(text, position)
+        parts.append(conditional_escape(text[offset:position]))
+        parts.append(format_html("<mark>{}</mark>", match.group()))
+        offset = match.end()
+    parts.append(conditional_escape(text[offset:end]))
+    if end < len(text):
+        parts.append("…")
+    return mark_safe("".join(parts))
+
+
+# Returns highlighted snippets of the entries matching a search query (title -> snippet html)
+# Snippets are cut from the indexed plain text at the offsets stored in the postings, so no entry is read or rescanned
+# Entries matching the query only in their title have no snippet
+def snippets(titles, query):
+    query_terms = set(tokenize(query))
+    if not titles or not query_terms:
+        return {}
+
+    positions = defaultdict(list)
+    for title, term_positions in Posting.objects.filter(
+            term__in=expand_terms(query), entry__title__in=titles).exclude(positions="").values_list(
+            "entry__title", "positions"):
+        positions[title].extend(int(position) for position in term_positions.split())
+
+    texts = IndexedEntry.objects.filter(title__in=positions).values_list("title", "text")
+    return {title: highlight(text, sorted(positions[title])) for title, text in texts}
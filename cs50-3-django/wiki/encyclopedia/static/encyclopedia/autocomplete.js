@@ -0,0 +1,35 @@
+// When the page loads, suggests entry titles in the search box as the user types
+document.addEventListener('DOMContentLoaded', function() {
+  const search = document.querySelector('.search');
+  if (search) {
+    search.addEventListener('input', () => autocomplete(search));
+  }
+});
+
+
+// Fills the search box's suggestions with the entry titles starting with what the user typed
+function autocomplete(search) {
+  const query = search.value.trim();
+  const results = document.querySelector('#autocomplete-results');
+
+  if (query === '') {
+    results.innerHTML = '';
+    return;
+  }
+
+  fetch(`${search.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`)
+  .then(response => response.json())
+  .then(data => {
+
+    // Ignores the response if the user kept typing in the meantime
+    if (search.value.trim() !== query) {
+      return;
+    }
+    results.innerHTML = '';
+    data.results.forEach(title => {
+      const option = document.createElement('option');
+      option.value = title;
+      results.append(option);
+    });
+  });
+}
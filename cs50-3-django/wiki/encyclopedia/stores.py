@@ -0,0 +1,276 @@
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from django.core.files.storage import default_storage
+
+from . import render, search_index
+from .revisions import RevisionLog
+
+# Entry stores hold the markdown of every encyclopedia entry. The store used by the app is chosen with the
+# WIKI_ENTRY_STORE setting (see settings.py) and every store provides the same methods:
+#   list_entries()              - names of all entries (in any order)
+#   version()                   - a value that changes whenever an entry is added or removed
+#   get_entry(title)            - markdown of an entry, or None if no such entry exists
+#   open_entry(title)           - binary file object for reading the entry's markdown (utf-8), or None if no such entry exists
+#   size(title)                 - size of the entry's markdown in bytes, or None if no such entry exists
+#   modified(title)             - time the entry was last saved (seconds since the epoch), or None if no such entry exists
+#   save_entry(title, content)  - creates or replaces an entry
+#   delete_entry(title)         - deletes an entry
+# Stores keeping old revisions of entries (RevisionEntryStore) also provide:
+#   history(title)              - (number, time saved, size in bytes) of every revision of an entry, oldest first
+#   get_revision(title, number) - markdown of a revision of an entry, or None if no such revision exists
+
+
+# Stores each entry as a markdown file (entries/<title>.md) in Django's default file storage
+class FileSystemEntryStore:
+
+    def __init__(self, directory="entries"):
+        self.directory = directory
+
+    def _filename(self, title):
+        return f"{self.directory}/{title}.md"
+
+    def list_entries(self):
+        _, filenames = default_storage.listdir(self.directory)
+        return [re.sub(r"\.md$", "", filename)
+                for filename in filenames if filename.endswith(".md")]
+
+    # Uses the directory's modification time, which changes whenever a file is added or removed
+    def version(self):
+        path = default_storage.path(self.directory)
+        return (path, os.stat(path).st_mtime_ns)
+
+    def get_entry(self, title):
+        try:
+            f = default_storage.open(self._filename(title))
+            return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def open_entry(self, title):
+        try:
+            return default_storage.open(self._filename(title), "rb")
+        except FileNotFoundError:
+            return None
+
+    def size(self, title):
+        try:
+            return os.stat(default_storage.path(self._filename(title))).st_size
+        except FileNotFoundError:
+            return None
+
+    def modified(self, title):
+        try:
+            return os.stat(default_storage.path(self._filename(title))).st_mtime
+        except FileNotFoundError:
+            return None
+
+    # Writes the entry to a temporary file renamed over the entry, so readers see either the old or the new content
+    # (never a missing entry) and concurrent saves never get renamed to another title by the storage
+    def save_entry(self, title, content):
+        path = default_storage.path(self._filename(title))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+        with open(temporary_path, "wb") as f:
+            f.write(content.encode("utf-8"))
+        os.replace(temporary_path, path)
+
+    def delete_entry(self, title):
+        default_storage.delete(self._filename(title))
+
+
+# Keeps every revision of each entry in an append-only, delta-compressed log (see revisions.py) in the default file
+# storage. Saving appends a revision and atomically replaces the log's head, so readers never wait or miss an entry
+class RevisionEntryStore:
+
+    def __init__(self, directory="revisions"):
+        self.directory = directory
+
+    def _log(self, title):
+        return RevisionLog(default_storage.path(self.directory), title)
+
+    def list_entries(self):
+        try:
+            filenames = os.listdir(default_storage.path(self.directory))
+        except FileNotFoundError:
+            return []
+        return [filename[:-len(".head")] for filename in filenames if filename.endswith(".head")]
+
+    # Uses the directory's modification time, which changes whenever a head file is added, replaced or removed
+    def version(self):
+        path = default_storage.path(self.directory)
+        try:
+            return (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return (path, None)
+
+    def get_entry(self, title):
+        return self._log(title).read()
+
+    def open_entry(self, title):
+        content = self.get_entry(title)
+        return io.BytesIO(content.encode("utf-8")) if content is not None else None
+
+    def size(self, title):
+        head = self._log(title).head()
+        return head["size"] if head else None
+
+    def modified(self, title):
+        head = self._log(title).head()
+        return head["modified"] if head else None
+
+    def save_entry(self, title, content):
+        self._log(title).append(content)
+
+    def delete_entry(self, title):
+        self._log(title).delete()
+
+    def history(self, title):
+        return self._log(title).history()
+
+    def get_revision(self, title, number):
+        return self._log(title).read(number)
+
+
+# Stores every entry in a single SQLite database: titles, markdown, pre-rendered html and an FTS5 full-text table
+# The html is stored with the fingerprint of the markdown options it was rendered with (see render.options_fingerprint),
+# so it is only served while those options don't change. The app also uses the FTS5 table for search (see
+# util.search_entries) and the stored html for entry pages (see util.entry_html)
+# Each entry's row in the FTS5 table has the entry's id as its rowid, so it is replaced and deleted by rowid (deleting
+# by title would scan the whole FTS5 table)
+class SQLiteEntryStore:
+
+    ENTRIES_TABLE = """
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL UNIQUE,
+            content TEXT NOT NULL,
+            html TEXT NOT NULL,
+            html_options TEXT NOT NULL DEFAULT '',
+            modified REAL NOT NULL
+        )
+    """
+
+    SCHEMA = ENTRIES_TABLE + """;
+        CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(title, content);
+        CREATE TABLE IF NOT EXISTS store_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO store_version (id, version) VALUES (1, 0);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(self.SCHEMA)
+
+            # Databases created before the html was stored with its options fingerprint get the column added
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(entries)")]
+            if "html_options" not in columns:
+                connection.execute("ALTER TABLE entries ADD COLUMN html_options TEXT NOT NULL DEFAULT ''")
+
+            # Databases created before entries had an id get their entries copied into the new table, and the FTS5
+            # table rebuilt with the ids as rowids
+            if "id" not in columns:
+                connection.execute("BEGIN")
+                connection.execute("ALTER TABLE entries RENAME TO entries_old")
+                connection.execute(self.ENTRIES_TABLE)
+                connection.execute("INSERT INTO entries (title, content, html, html_options, modified) "
+                                   "SELECT title, content, html, html_options, modified FROM entries_old")
+                connection.execute("DROP TABLE entries_old")
+                connection.execute("DELETE FROM entries_fts")
+                connection.execute("INSERT INTO entries_fts (rowid, title, content) SELECT id, title, content FROM entries")
+
+    # Returns this thread's connection to the database (sqlite3 connections can't be shared between threads)
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def list_entries(self):
+        rows = self._connection().execute("SELECT title FROM entries")
+        return [title for title, in rows]
+
+    # Uses a counter incremented by every save and delete (in the same transaction as the change)
+    def version(self):
+        row = self._connection().execute("SELECT version FROM store_version WHERE id = 1").fetchone()
+        return (self.path, row[0])
+
+    def get_entry(self, title):
+        row = self._connection().execute("SELECT content FROM entries WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    # Returns the html the entry was rendered to with the markdown options of the given fingerprint, or None if no such
+    # entry exists or its html was rendered with other options
+    def get_html(self, title, fingerprint):
+        row = self._connection().execute(
+            "SELECT html FROM entries WHERE title = ? AND html_options = ?", (title, fingerprint)).fetchone()
+        return row[0] if row else None
+
+    # Stores the html an entry was rendered to (with the markdown options of the given fingerprint), unless the entry's
+    # content changed since the html was rendered from it
+    def save_html(self, title, content, html, fingerprint):
+        with self._connection() as connection:
+            connection.execute("UPDATE entries SET html = ?, html_options = ? WHERE title = ? AND content = ?",
+                               (html, fingerprint, title, content))
+
+    def open_entry(self, title):
+        content = self.get_entry(title)
+        return io.BytesIO(content.encode("utf-8")) if content is not None else None
+
+    def size(self, title):
+        row = self._connection().execute(
+            "SELECT length(CAST(content AS BLOB)) FROM entries WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def modified(self, title):
+        row = self._connection().execute("SELECT modified FROM entries WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def save_entry(self, title, content):
+        html = render.md_to_html(content, title)
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO entries (title, content, html, html_options, modified) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (title) DO UPDATE SET content = excluded.content, html = excluded.html, "
+                "html_options = excluded.html_options, modified = excluded.modified",
+                (title, content, html, render.options_fingerprint(), time.time())
+            )
+            entry_id = connection.execute("SELECT id FROM entries WHERE title = ?", (title,)).fetchone()[0]
+            connection.execute("DELETE FROM entries_fts WHERE rowid = ?", (entry_id,))
+            connection.execute("INSERT INTO entries_fts (rowid, title, content) VALUES (?, ?, ?)",
+                               (entry_id, title, content))
+            connection.execute("UPDATE store_version SET version = version + 1 WHERE id = 1")
+
+    def delete_entry(self, title):
+        with self._connection() as connection:
+            row = connection.execute("SELECT id FROM entries WHERE title = ?", (title,)).fetchone()
+            if row is not None:
+                connection.execute("DELETE FROM entries WHERE id = ?", row)
+                connection.execute("DELETE FROM entries_fts WHERE rowid = ?", row)
+            connection.execute("UPDATE store_version SET version = version + 1 WHERE id = 1")
+
+    # Returns the titles of the entries matching every word of a search, best match first (the last word also matches
+    # as a prefix, like search_index.search)
+    def search(self, query, limit=50):
+        # Quotes every word so user input can't be parsed as FTS5 query syntax
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " ".join(f'"{word}"' for word in words)
+        if len(words[-1]) >= search_index.MIN_PREFIX_LENGTH:
+            match += "*"
+        rows = self._connection().execute(
+            "SELECT title FROM entries_fts WHERE entries_fts MATCH ? ORDER BY bm25(entries_fts, 3.0, 1.0) LIMIT ?",
+            (match, limit)
+        )
+        return [title for title, in rows]
@@ -0,0 +1,92 @@
+import re
+import uuid
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+
+# Number of bytes read from a file at a time when streaming it
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# Yields the bytes of a binary file in chunks, from start up to length bytes (or the end of the file), then closes it
+def read_chunks(f, start=0, length=None):
+    try:
+        f.seek(start)
+        while length is None or length > 0:
+            chunk = f.read(CHUNK_SIZE if length is None else min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+# Returns the (first byte, last byte) requested by a Range header, or None if the whole file should be sent
+# (no header, or several ranges). Raises ValueError if the range can't be satisfied
+def parse_range(header, size):
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+
+    # "bytes=-N" asks for the last N bytes
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+
+    first = int(first)
+    last = size - 1 if last == "" else min(int(last), size - 1)
+    if first >= size or first > last:
+        raise ValueError("range not satisfiable")
+    return first, last
+
+
+# Streams a binary file, answering Range requests with 206 Partial Content
+# (the ETag is used to check If-Range, so a range of an outdated version is never sent)
+def ranged_response(request, f, size, content_type, etag=None):
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if if_range is None or (etag is not None and if_range == etag):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            f.close()
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(read_chunks(f), content_type=content_type)
+        response["Content-Length"] = str(size)
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(read_chunks(f, first, last - first + 1), content_type=content_type, status=206)
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+        response["Content-Length"] = str(last - first + 1)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+# Streams a page whose "content" is the html in a file: the template is rendered around a placeholder, and the
+# file is streamed in its place, so the html is never loaded into memory
+def stream_template(request, template_name, context, html_path):
+    placeholder = f"<!--{uuid.uuid4().hex}-->"
+    page = render_to_string(template_name, {**context, "content": placeholder}, request)
+    head, tail = page.split(placeholder, 1)
+
+    def chunks():
+        yield head.encode("utf-8")
+        yield from read_chunks(open(html_path, "rb"))
+        yield tail.encode("utf-8")
+
+    return StreamingHttpResponse(chunks(), content_type="text/html; charset=utf-8")
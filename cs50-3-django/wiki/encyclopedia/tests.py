@@ -1,3 +1,913 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import markdown
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from . import compression, export, links, outline, popularity, render, revisions, search_index, util
+from .catalog import Catalog
+from .fuzzy import TrigramIndex
+from .models import PageView
+from .stores import RevisionEntryStore, SQLiteEntryStore
+
+# Markdown fragments combined into the test corpus (headings, lists, quotes, code, tables, links, html...)
+FRAGMENTS = [
+    "# Heading", "Heading\n=======", "Subheading\n----------", "A paragraph with *emphasis* and `code`",
+    "Line one\nline two", "- item", "* starred item", "+ plus item", "1. first", "2) second", "    indented code",
+    "\ttabbed code", "> quote", "> quote\ncontinued lazily", "***", "---", "Hard  \nbreak", "```\nfenced\n\ncode\n```",
+    "~~~\ntilde fence\n~~~", "| a | b |\n|---|---|\n| 1 | 2 |", "[Python](/wiki/Python)", "![image](image.png)",
+    "   indented paragraph", "  - nested item", "- item\n\n    continued item", "***bold italic***", "_underscored_",
+    "<b>inline html</b> at the start", "Text with <span>inline html</span>", "1986\\. escaped number", "&amp; entity",
+    "<div>\n\nhtml block\n\n</div>", "[reference][1]\n\n[1]: /wiki/HTML", "````\nfour\n```\n\nstill code\n````",
+    "```\ncode\n```python\n\nstill code\n```", "  ```\nindented fence\n\nparagraph\n```", "```\nclosed\n```   ",
+]
+SEPARATORS = ["\n", "\n\n", "\n\n\n", "\n \n"]
+
+
+# Returns the test corpus: the bundled entries and random combinations of the fragments
+def corpus():
+    documents = []
+    directory = os.path.join(settings.BASE_DIR, "entries")
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            documents.append(f.read())
+    rng = random.Random(17)
+    for _ in range(1000):
+        documents.append("".join(rng.choice(FRAGMENTS) + rng.choice(SEPARATORS) for _ in range(rng.randint(1, 12))))
+    return documents
+
+
+# Page views are only added to the database when the tests flush them (no background thread writing to the test database)
+_flush_interval_override = override_settings(WIKI_VIEW_FLUSH_INTERVAL=0)
+
+
+def setUpModule():
+    _flush_interval_override.enable()
+
+
+def tearDownModule():
+    _flush_interval_override.disable()
+
+
+# Entry storage for catalog tests: a set of titles whose version changes whenever a title is added or removed
+class FakeStorage:
+
+    def __init__(self, titles):
+        self.titles = set(titles)
+        self.version = 0
+        self.scans = 0
+
+    def scan(self):
+        self.scans += 1
+        return list(self.titles)
+
+    def add(self, title):
+        self.titles.add(title)
+        self.version += 1
+
+    def catalog(self):
+        return Catalog(self.scan, lambda: self.version)
+
+
+class CatalogTests(TestCase):
+
+    def test_titles_are_loaded_once_and_reloaded_when_storage_changes(self):
+        storage = FakeStorage(["Python", "CSS", "Git"])
+        catalog = storage.catalog()
+        self.assertEqual(catalog.titles(), ["CSS", "Git", "Python"])
+        self.assertTrue(catalog.contains("Git"))
+        self.assertEqual(storage.scans, 1)
+
+        storage.add("HTML")
+        self.assertEqual(catalog.titles(), ["CSS", "Git", "HTML", "Python"])
+        self.assertEqual(storage.scans, 2)
+
+    def test_titles_containing_a_search_are_found_through_trigrams(self):
+        titles = [f"Entry {i:05d}" for i in range(20000)] + ["Version Control", "version history", "Conversion"]
+        catalog = FakeStorage(titles).catalog()
+        self.assertEqual(catalog.containing("VERSION"), ["Conversion", "Version Control", "version history"])
+        self.assertEqual(catalog.containing("ion con"), ["Version Control"])
+        self.assertEqual(catalog.containing("ersion", limit=2), ["Conversion", "Version Control"])
+
+        # Only the titles having the search's trigrams are compared with the search
+        self.assertEqual(len(catalog._trigram_index.substring_candidates("ersion")), 3)
+
+        # Searches shorter than a trigram scan the titles up to the limit
+        self.assertEqual(catalog.containing("y", limit=3), ["Entry 00000", "Entry 00001", "Entry 00002"])
+        self.assertEqual(catalog.containing("zz"), [])
+
+    def test_saves_update_the_catalog_without_a_rescan(self):
+        storage = FakeStorage(["Python", "CSS"])
+        catalog = storage.catalog()
+        catalog.titles()
+        version = catalog.storage_version()
+        storage.add("Git")
+        catalog.add("Git", version)
+
+        version = catalog.storage_version()
+        storage.titles.discard("CSS")
+        storage.version += 1
+        catalog.remove("CSS", version)
+        self.assertEqual(catalog.titles(), ["Git", "Python"])
+        self.assertEqual(storage.scans, 1)
+
+    def test_changes_made_by_other_processes_before_a_save_are_reloaded(self):
+        storage = FakeStorage(["Python"])
+        catalog = storage.catalog()
+        catalog.titles()
+
+        # Another process adds CSS after the titles were loaded, then this process saves Git
+        storage.add("CSS")
+        version = catalog.storage_version()
+        storage.add("Git")
+        catalog.add("Git", version)
+        self.assertEqual(catalog.titles(), ["CSS", "Git", "Python"])
+        self.assertEqual(storage.scans, 2)
+
+
+class IndexPagingTests(TestCase):
+
+    def test_cursor_pages_cover_every_title_once(self):
+        titles = [f"Entry {i:03d}" for i in range(250)] + ["apple", "Apple", "Banana"]
+        catalog = FakeStorage(titles).catalog()
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = catalog.page(cursor, limit=40)
+            self.assertLessEqual(len(page), 40)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(titles))
+        self.assertEqual(seen[:3], ["Apple", "apple", "Banana"])
+
+    def test_letter_pages(self):
+        catalog = FakeStorage(["apple", "Apricot", "Banana", "Cherry"]).catalog()
+        self.assertEqual(catalog.page(letter="A", limit=1), (["apple"], "apple"))
+        self.assertEqual(catalog.page("apple", letter="A", limit=1), (["Apricot"], None))
+        self.assertEqual(catalog.letters(), ["A", "B", "C"])
+
+    @override_settings(WIKI_INDEX_PAGE_SIZE=2)
+    def test_homepage_json_pages(self):
+        first = self.client.get("/index.json").json()
+        self.assertEqual(first, {"entries": ["CSS", "Django"], "next": "Django", "letter": None})
+        second = self.client.get("/index.json", {"after": first["next"]}).json()
+        self.assertEqual(second["entries"], ["Git", "HTML"])
+        self.assertContains(self.client.get("/", {"after": "HTML"}), "/wiki/Python")
+
+
+class AutocompleteTests(TestCase):
+
+    def test_titles_starting_with_the_prefix_are_suggested_in_order(self):
+        catalog = FakeStorage(["Python", "PyPI", "pytest", "Perl", "CSS"]).catalog()
+        self.assertEqual(catalog.complete("py"), ["PyPI", "pytest", "Python"])
+        self.assertEqual(catalog.complete("PY", limit=2), ["PyPI", "pytest"])
+        self.assertEqual(catalog.complete("x"), [])
+
+    def test_autocomplete_endpoint(self):
+        self.assertEqual(self.client.get("/autocomplete", {"q": "h"}).json(), {"results": ["HTML"]})
+        self.assertEqual(self.client.get("/autocomplete", {"q": ""}).json(), {"results": []})
+        self.assertEqual(self.client.get("/autocomplete", {"q": "c", "limit": "x"}).json(), {"results": ["CSS"]})
+
+
+class FuzzyMatchTests(TestCase):
+
+    def test_typos_find_similar_titles(self):
+        index = TrigramIndex(["Python", "Pygame", "HTML", "JavaScript"])
+        self.assertEqual(index.search("Pyhton")[0], "Python")
+        self.assertEqual(index.search("javascrpit"), ["JavaScript"])
+        self.assertEqual(index.search("xyz"), [])
+
+        index.remove("Python")
+        self.assertNotIn("Python", index.search("Pyhton"))
+
+    def test_search_results_suggest_similar_titles(self):
+        response = self.client.post("/search", {"q": "Djnago"})
+        self.assertEqual(response.context["suggestions"], ["Django"])
+
+
+class ConditionalRequestTests(TestCase):
+
+    def setUp(self):
+        render.clear_caches()
+
+    def test_entry_pages_answer_revalidations_with_304(self):
+        response = self.client.get("/wiki/CSS")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(self.client.get("/wiki/css", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get("/wiki/CSS", HTTP_IF_NONE_MATCH='W/"outdated"').status_code, 200)
+
+        with mock.patch.object(util, "get_entry") as get_entry:
+            self.assertEqual(self.client.get("/wiki/CSS", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        get_entry.assert_not_called()
+
+    def test_entry_pages_read_the_entry_once(self):
+        store = util.get_store()
+        with mock.patch.object(store, "get_entry", wraps=store.get_entry) as get_entry, \
+                mock.patch.object(store, "open_entry", wraps=store.open_entry) as open_entry:
+            response = self.client.get("/wiki/CSS")
+            self.assertEqual(get_entry.call_count + open_entry.call_count, 1)
+            self.assertEqual(self.client.get("/wiki/CSS", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+            self.assertEqual(get_entry.call_count + open_entry.call_count, 1)
+
+    def test_saving_an_entry_changes_its_etag(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        with override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root):
+            util.save_entry("Git", "First")
+            etag = self.client.get("/wiki/Git")["ETag"]
+            util.save_entry("Git", "Second")
+            response = self.client.get("/wiki/Git", HTTP_IF_NONE_MATCH=etag)
+            self.assertContains(response, "Second")
+            self.assertNotEqual(response["ETag"], etag)
+
+    def test_entry_records_are_cached_apart_from_entry_html(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        with override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root):
+            util.save_entry("Git", "# Git")
+            self.client.get("/wiki/Git")
+            html_key = render.get_meta_cache().get(render.title_key("Git"))
+            self.assertEqual(render.get_cache().get(html_key), "<h1>Git</h1>")
+            self.assertIsNone(render.get_cache().get(render.title_key("Git")))
+            self.assertIsNone(render.get_cache().get(util._metadata_key("Git")))
+
+    # Saving doesn't pair its content's hash with the modification time it reads after the save, which a concurrent
+    # save of other content may have set
+    def test_saves_never_remember_a_hash_for_other_content(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        with override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root):
+            store = util.get_store()
+            save = store.save_entry
+
+            # Another save of the entry completes while this one is between its write and its bookkeeping
+            def save_then_overwrite(title, content):
+                save(title, content)
+                if content == "A":
+                    save(title, "B")
+
+            with mock.patch.object(store, "save_entry", side_effect=save_then_overwrite):
+                util.write_entry("Git", "A")
+            self.assertEqual(util.entry_hash("Git"), hashlib.sha256(b"B").hexdigest())
+
+    def test_homepage_etag_changes_when_entries_are_added(self):
+        response = self.client.get("/")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        with mock.patch.object(util.catalog, "fingerprint", return_value="changed"):
+            self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_raw_and_html_etags_are_strong(self):
+        for path in ["/wiki/CSS/raw", "/wiki/CSS/html"]:
+            response = self.client.get(path)
+            self.assertTrue(response["ETag"].startswith('"'), path)
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+class LinkTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        settings_override = override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_new_backlinks_change_the_entry_etag(self):
+        util.save_entry("Alpha", "# Alpha")
+        response = self.client.get("/wiki/Alpha")
+        self.assertNotIn("Last-Modified", response)
+
+        util.save_entry("Beta", "See [Alpha](/wiki/Alpha)")
+        response = self.client.get("/wiki/Alpha", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<a href="/wiki/Beta">Beta</a>', html=True)
+
+    def test_broken_links_are_found_in_two_queries(self):
+        util.save_entry("Alpha", "[Beta](/wiki/Beta) [Gamma](/wiki/gamma) [Delta](/wiki/Delta)")
+        util.save_entry("Gamma", "[Beta](/wiki/Beta) [Alpha](/wiki/alpha)")
+        with self.assertNumQueries(2):
+            broken = links.broken_links(util.resolve_title)
+        self.assertEqual(broken, [("Alpha", "Beta"), ("Alpha", "Delta"), ("Gamma", "Beta")])
+
+
+class RawSourceTests(TestCase):
+
+    def setUp(self):
+        with open(os.path.join(settings.BASE_DIR, "entries", "CSS.md"), "rb") as f:
+            self.source = f.read()
+
+    def get(self, **headers):
+        response = self.client.get("/wiki/css/raw", headers=headers)
+        return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_whole_source_is_streamed(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.source)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_ranges(self):
+        size = len(self.source)
+        response, content = self.get(Range="bytes=0-9")
+        self.assertEqual((response.status_code, content), (206, self.source[:10]))
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{size}")
+
+        self.assertEqual(self.get(Range="bytes=-5")[1], self.source[-5:])
+        self.assertEqual(self.get(Range=f"bytes=10-{size + 100}")[1], self.source[10:])
+
+        response, _ = self.get(Range=f"bytes={size}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{size}")
+
+    def test_if_range_with_an_outdated_etag_sends_the_whole_source(self):
+        etag = self.get()[0]["ETag"]
+        self.assertEqual(self.get(Range="bytes=0-9", **{"If-Range": etag})[0].status_code, 206)
+        response, content = self.get(Range="bytes=0-9", **{"If-Range": '"outdated"'})
+        self.assertEqual((response.status_code, content), (200, self.source))
+
+    def test_large_entry_pages_are_streamed_from_their_html_file(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        with override_settings(WIKI_STREAM_THRESHOLD=1, WIKI_HTML_SPOOL_DIR=spool_dir):
+            response = self.client.get("/wiki/CSS")
+            self.assertTrue(response.streaming)
+            self.assertIn(b'<h1 id="css">CSS</h1>', b"".join(response.streaming_content))
+            self.assertEqual(len(os.listdir(spool_dir)), 1)
+
+
+class TitleResolutionTests(TestCase):
+
+    def test_titles_are_resolved_ignoring_case(self):
+        storage = FakeStorage(["Python", "HTML", "iOS", "IOS"])
+        catalog = storage.catalog()
+        self.assertEqual(catalog.resolve("python"), "Python")
+        self.assertEqual(catalog.resolve("html"), "HTML")
+        self.assertEqual(catalog.resolve("Ruby"), None)
+
+        # Titles only differing in case resolve to themselves, and other spellings to the first of them
+        self.assertEqual(catalog.resolve("iOS"), "iOS")
+        self.assertEqual(catalog.resolve("IOS"), "IOS")
+        self.assertEqual(catalog.resolve("ios"), "IOS")
+        catalog.remove("IOS", catalog.storage_version())
+        self.assertEqual(catalog.resolve("ios"), "iOS")
+
+    def test_entry_pages_and_new_entries_ignore_case(self):
+        self.assertContains(self.client.get("/wiki/pYtHoN"), "<h1 id=\"python\">Python</h1>")
+        response = self.client.post("/create", {"title": "python", "content": "Duplicate"})
+        self.assertContains(response, "Entry already exists")
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        search_index.index_entry("Git", "Git is a version control tool used by Python developers.")
+        search_index.index_entry("Python", "# Python\n\nPython is a programming language.")
+        search_index.index_entry("Version", "Version control keeps every version of every file. Version after version.")
+
+    def test_bm25_ranks_entries_matching_more_often_first(self):
+        self.assertEqual(search_index.search("python"), ["Python", "Git"])
+        self.assertEqual(search_index.search("version"), ["Version", "Git"])
+        self.assertEqual(search_index.search("missing"), [])
+
+    def test_only_the_last_term_is_expanded_as_a_prefix(self):
+        self.assertEqual(search_index.search("programming pyth"), ["Python", "Git"])
+        self.assertEqual(search_index.search("pyth programming"), ["Python"])
+        self.assertEqual(search_index.search("py"), [])
+
+    def test_prefix_expansion_is_capped(self):
+        search_index.index_entry("Words", " ".join(f"word{i}" for i in range(100)))
+        self.assertEqual(len(search_index.expand_terms("wor")), search_index.MAX_PREFIX_TERMS + 1)
+
+    def test_titles_containing_the_search_are_found(self):
+        self.assertEqual(util.search_entries("yth"), ["Python"])
+        self.assertEqual(util.search_entries("tml"), ["HTML"])
+        self.assertEqual(util.search_entries("control"), ["Git", "Version"])
+        self.assertContains(self.client.post("/search", {"q": "jang"}), "/wiki/Django")
+
+
+class SQLiteEntryStoreTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "entries.sqlite3")
+        settings_override = override_settings(WIKI_EXPORT_DIR=None, WIKI_ENTRY_STORE={
+            "BACKEND": "encyclopedia.stores.SQLiteEntryStore", "OPTIONS": {"PATH": self.path}
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        render.clear_caches()
+        self.store = util.get_store()
+
+    def test_entries_are_saved_and_deleted(self):
+        version = self.store.version()
+        self.store.save_entry("Café", "# Café\n\nCoffee")
+        self.assertEqual(self.store.get_entry("Café"), "# Café\n\nCoffee")
+        self.assertEqual(self.store.size("Café"), len("# Café\n\nCoffee".encode("utf-8")))
+        self.assertEqual(self.store.list_entries(), ["Café"])
+        self.assertNotEqual(self.store.version(), version)
+
+        self.store.delete_entry("Café")
+        self.assertIsNone(self.store.get_entry("Café"))
+        self.assertIsNone(self.store.modified("Café"))
+        self.assertEqual(self.store.search("coffee"), [])
+
+    def test_full_text_rows_are_replaced_and_deleted_by_rowid(self):
+        statements = []
+        self.store._connection().set_trace_callback(statements.append)
+        self.store.save_entry("Git", "Git is a version control tool.")
+        self.store.save_entry("Git", "Git tracks changes.")
+        self.store.save_entry("CSS", "CSS styles pages.")
+        self.store.delete_entry("CSS")
+        self.store._connection().set_trace_callback(None)
+
+        fts_deletes = [statement for statement in statements if statement.startswith("DELETE FROM entries_fts")]
+        self.assertEqual(len(fts_deletes), 4)
+        # FTS5 plans a lookup by rowid as index "0:=" (a full scan, e.g. for a title, is index "0:")
+        for statement in fts_deletes:
+            plan = self.store._connection().execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+            self.assertTrue(plan[0][-1].endswith("VIRTUAL TABLE INDEX 0:="), statement)
+        self.assertEqual(self.store.search("tracks"), ["Git"])
+        self.assertEqual(self.store.search("version"), [])
+        self.assertEqual(self.store._connection().execute("SELECT count(*) FROM entries_fts").fetchone()[0], 1)
+
+    def test_databases_without_entry_ids_are_migrated(self):
+        path = os.path.join(os.path.dirname(self.path), "old.sqlite3")
+        with sqlite3.connect(path) as connection:
+            connection.executescript("""
+                CREATE TABLE entries (title TEXT PRIMARY KEY, content TEXT NOT NULL, html TEXT NOT NULL,
+                                      modified REAL NOT NULL);
+                CREATE VIRTUAL TABLE entries_fts USING fts5(title, content);
+                INSERT INTO entries VALUES ('Git', 'Git tracks changes.', '', 0);
+                INSERT INTO entries_fts VALUES ('Git', 'Git tracks changes.');
+            """)
+        connection.close()
+        store = SQLiteEntryStore(path)
+        self.assertEqual(store.get_entry("Git"), "Git tracks changes.")
+        self.assertEqual(store.search("tracks"), ["Git"])
+        store.delete_entry("Git")
+        self.assertEqual(store.search("tracks"), [])
+
+    def test_search_uses_the_full_text_table(self):
+        util.save_entry("Python", "Python is a programming language.")
+        util.save_entry("Git", "Git is a version control tool.")
+        with mock.patch.object(search_index, "search") as bm25_search:
+            self.assertEqual(util.search_entries("program"), ["Python"])
+            self.assertEqual(util.search_entries("version tool"), ["Git"])
+        bm25_search.assert_not_called()
+
+    def test_stored_html_is_only_served_with_the_options_it_was_rendered_with(self):
+        util.save_entry("Python", "# Python\n\nA language.")
+        render.get_cache().clear()
+        with mock.patch.object(render, "convert") as convert:
+            self.assertContains(self.client.get("/wiki/Python"), "<p>A language.</p>")
+        convert.assert_not_called()
+
+        with override_settings(WIKI_MARKDOWN={"EXTENSIONS": ["nl2br"]}):
+            self.assertIsNone(self.store.get_html("Python", render.options_fingerprint()))
+            self.assertContains(self.client.get("/wiki/Python"), "<p>A language.</p>")
+            self.assertIsNotNone(self.store.get_html("Python", render.options_fingerprint()))
+
+    def test_migrate_entries_copies_every_markdown_file(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        for title in ["CSS", "Git"]:
+            with open(os.path.join(media_root, "entries", f"{title}.md"), "w", encoding="utf-8") as f:
+                f.write(f"# {title}")
+
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command("migrate_entries", path=self.path, stdout=io.StringIO())
+            call_command("migrate_entries", store="revisions", stdout=io.StringIO())
+            self.assertEqual(RevisionEntryStore().get_entry("Git"), "# Git")
+        self.assertEqual(sorted(self.store.list_entries()), ["CSS", "Git"])
+        self.assertEqual(self.store.get_entry("CSS"), "# CSS")
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_exported_pages_only_link_to_django_served_forms(self):
+        export.export_entry(self.directory, "Python", util.get_entry("Python"))
+        export.export_index(self.directory)
+        pages = []
+        for path in [export.entry_path(self.directory, "Python"), os.path.join(self.directory, "index.html")]:
+            with open(path, encoding="utf-8") as f:
+                pages.append(f.read())
+            self.assertNotIn('method="post"', pages[-1])
+            self.assertNotIn("csrfmiddlewaretoken", pages[-1])
+            self.assertIn('<form action="/search" method="get">', pages[-1])
+        self.assertIn('href="/edit?title=Python"', pages[0])
+        self.assertIn('href="/delete?title=Python"', pages[0])
+
+        # Every link and form of the exported pages works with CSRF checks enforced
+        client = Client(enforce_csrf_checks=True)
+        self.assertContains(client.get("/search", {"q": "python"}), "<h1 id=\"python\">Python</h1>")
+        self.assertContains(client.get("/edit", {"title": "python"}), "csrfmiddlewaretoken")
+        response = client.get("/delete", {"title": "Python"})
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertContains(response, 'action="/delete" method="post"')
+
+
+    # Workers are forked even where the default start method spawns them (macOS, and forkserver on Python 3.14)
+    def test_export_wiki_works_with_any_default_start_method(self):
+        start_method = multiprocessing.get_start_method()
+        multiprocessing.set_start_method("spawn", force=True)
+        self.addCleanup(multiprocessing.set_start_method, start_method, force=True)
+        self.assertEqual(export.export_wiki(self.directory, workers=2, batch_size=2), len(util.list_entries()))
+        self.assertTrue(os.path.exists(export.entry_path(self.directory, "Python")))
+
+
+class ImportExportTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        render.clear_caches()
+
+    # Uses an empty entries directory as the entry store
+    def use_empty_store(self):
+        media_root = tempfile.mkdtemp(dir=self.directory)
+        os.makedirs(os.path.join(media_root, "entries"))
+        settings_override = override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_files(self, files):
+        source = os.path.join(self.directory, "source")
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(source, path)), exist_ok=True)
+            with open(os.path.join(source, path), "w", encoding="utf-8") as f:
+                f.write(content)
+        return source
+
+    def test_entries_round_trip_through_a_directory_and_a_tar_archive(self):
+        self.use_empty_store()
+        source = self.write_files({
+            "a/Git.md": "Git is a version control tool.", "b/Git.md": "Another Git.", "CSS.md": "CSS styles pages.",
+            "c/Python.md": "Python is a programming language.", "notes.txt": "Not an entry"
+        })
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("import_entries", source, batch_size=2, stdout=stdout, stderr=stderr)
+
+        # Files with the same name in other directories are skipped, not imported over the first one
+        self.assertEqual(util.list_entries(), ["CSS", "Git", "Python"])
+        self.assertEqual(util.get_entry("Git"), "Git is a version control tool.")
+        self.assertIn("Git.md", stderr.getvalue())
+
+        # Each batch of entries is indexed as it is written
+        self.assertEqual(stdout.getvalue().splitlines()[:2], ["2 entries imported, 0 unchanged",
+                                                              "3 entries imported, 0 unchanged"])
+        self.assertEqual(search_index.search("programming"), ["Python"])
+        self.assertEqual(search_index.search("version"), ["Git"])
+
+        # Importing the same files again skips every entry by its content hash
+        with mock.patch.object(util, "write_entry") as write_entry:
+            stdout = io.StringIO()
+            call_command("import_entries", source, stdout=stdout, stderr=io.StringIO())
+        write_entry.assert_not_called()
+        self.assertIn("Imported 0 entries (3 unchanged entries skipped)", stdout.getvalue())
+
+        archive = os.path.join(self.directory, "entries.tar.gz")
+        call_command("export_entries", archive, stdout=io.StringIO())
+        self.use_empty_store()
+        call_command("import_entries", archive, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(util.list_entries(), ["CSS", "Git", "Python"])
+        self.assertEqual(util.get_entry("Python"), "Python is a programming language.")
+        self.assertEqual(search_index.search("styles"), ["CSS"])
+
+
+class BlockRenderingTests(TestCase):
+
+    def setUp(self):
+        render.clear_caches()
+
+    # Checks that rendering block by block gives exactly the html of a full render for every document of the corpus
+    def assertBlockRenderMatches(self, extensions):
+        with override_settings(WIKI_MARKDOWN={"EXTENSIONS": extensions}):
+            converter = markdown.Markdown(extensions=extensions)
+            for document in corpus():
+                converter.reset()
+                self.assertEqual(render.md_to_html(document), converter.convert(document), document)
+
+    def test_block_render_matches_full_render(self):
+        self.assertBlockRenderMatches([])
+
+    def test_block_render_matches_full_render_with_extensions(self):
+        self.assertBlockRenderMatches(["tables", "fenced_code"])
+
+    def test_documents_depending_on_other_blocks_are_not_split(self):
+        self.assertIsNone(render.split_blocks("[reference][1]\n\n[1]: /wiki/HTML"))
+        self.assertIsNone(render.split_blocks("<div>\n\nhtml block\n\n</div>"))
+        with override_settings(WIKI_MARKDOWN={"EXTENSIONS": ["toc"]}):
+            self.assertIsNone(render.split_blocks("# A\n\n# A"))
+
+    def test_edit_only_renders_changed_blocks(self):
+        paragraphs = [f"Paragraph {i} of a long entry." for i in range(50)]
+        render.md_to_html("\n\n".join(paragraphs))
+
+        paragraphs[25] = "An edited paragraph."
+        with mock.patch.object(render, "convert", wraps=render.convert) as convert:
+            html_content = render.md_to_html("\n\n".join(paragraphs))
+        convert.assert_called_once_with("An edited paragraph.")
+        self.assertIn("<p>An edited paragraph.</p>", html_content)
+
+    def test_blocks_are_cached_apart_from_entry_html(self):
+        before = render.cache_stats()
+        render.md_to_html("\n\n".join(f"Paragraph {i}" for i in range(300)))
+        key = render.cache_key("Paragraph 5", "block")
+        self.assertIsNone(render.get_cache().get(key))
+        self.assertEqual(render.get_block_cache().get(key), "<p>Paragraph 5</p>")
+        stats = render.cache_stats()
+        self.assertEqual(stats["blocks"]["misses"] - before["blocks"]["misses"], 300)
+        self.assertEqual(stats["blocks"]["max_entries"], settings.CACHES[render.BLOCK_CACHE_ALIAS]["OPTIONS"]["MAX_ENTRIES"])
+
+
+class CompressionTests(TestCase):
+
+    def setUp(self):
+        render.clear_caches()
+
+    def test_html_is_only_compressed_when_first_requested_compressed(self):
+        with mock.patch.object(compression, "compress", wraps=compression.compress) as compress:
+            self.client.get("/wiki/CSS")
+            compress.assert_not_called()
+            self.client.get("/wiki/CSS/html", HTTP_ACCEPT_ENCODING="gzip")
+            self.client.get("/wiki/CSS/html", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compress.call_count, 1)
+        self.assertGreaterEqual(render.cache_stats()["compressed"]["hits"], 1)
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding("gzip, deflate"), "gzip")
+        self.assertIsNone(compression.choose_encoding("gzip;q=0, deflate"))
+        self.assertIsNone(compression.choose_encoding(""))
+
+    def test_entry_html_is_served_compressed(self):
+        response = self.client.get("/wiki/CSS/html", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), self.client.get("/wiki/CSS/html").content)
+
+        cached = self.client.get("/wiki/CSS/html", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+
+class AsyncViewTests(TestCase):
+
+    async def test_asgi_requests_use_async_views(self):
+        response = await self.async_client.get("/wiki/css")
+        self.assertEqual(response.resolver_match.func.__module__, "encyclopedia.async_views")
+        self.assertContains(response, "<h1 id=\"css\">CSS</h1>")
+
+    async def test_conditional_requests_are_answered_off_the_event_loop(self):
+        loop_thread = threading.current_thread()
+        threads = []
+
+        def resolve_title(title):
+            threads.append(threading.current_thread())
+            return util.catalog.resolve(title)
+
+        response = await self.async_client.get("/wiki/css")
+        with mock.patch.object(util, "resolve_title", side_effect=resolve_title):
+            cached = await self.async_client.get("/wiki/css", headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], response["ETag"])
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+
+        response = await self.async_client.get("/")
+        self.assertEqual((await self.async_client.get("/", headers={"If-None-Match": response["ETag"]})).status_code, 304)
+
+    def test_wsgi_requests_use_sync_views(self):
+        response = self.client.get("/wiki/css")
+        self.assertEqual(response.resolver_match.func.__module__, "encyclopedia.views")
+        self.assertContains(response, "<h1 id=\"css\">CSS</h1>")
+
+
+class SearchSnippetTests(TestCase):
+
+    def test_snippets_highlight_matches_from_the_index(self):
+        search_index.index_entry("Git", "# Git\n\nGit is a **version control** tool. [Python](/wiki/Python) uses it.")
+        search_index.index_entry("Tool", "Nothing to see here.")
+        snippets = search_index.snippets(search_index.search("control"), "control")
+        self.assertEqual(snippets, {"Git": "Git Git is a version <mark>control</mark> tool. Python uses it."})
+
+    def test_snippets_are_updated_when_an_entry_is_reindexed_or_removed(self):
+        search_index.index_entry("Git", "Git is a version control tool.")
+        search_index.index_entry("Git", "Git tracks changes.")
+        self.assertEqual(search_index.snippets(["Git"], "changes"), {"Git": "Git tracks <mark>changes</mark>."})
+        search_index.remove_entry("Git")
+        self.assertEqual(search_index.snippets(["Git"], "changes"), {})
+
+
+@override_settings(WIKI_ENTRY_STORE={"BACKEND": "encyclopedia.stores.RevisionEntryStore"}, WIKI_EXPORT_DIR=None)
+class RevisionStoreTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.store = util.get_store()
+
+    def test_every_revision_is_kept(self):
+        rng = random.Random(21)
+        lines = [f"Line {i}\n" for i in range(50)]
+        contents = []
+        for _ in range(3 * revisions.SEGMENT_REVISIONS + 5):
+            lines[rng.randrange(len(lines))] = f"Edited line {rng.random()}\n"
+            contents.append("".join(lines))
+            self.store.save_entry("Git", contents[-1])
+
+        self.assertEqual(self.store.get_entry("Git"), contents[-1])
+        self.assertEqual([number for number, _, _ in self.store.history("Git")], list(range(len(contents))))
+        for number, content in enumerate(contents):
+            self.assertEqual(self.store.get_revision("Git", number), content)
+        self.assertIsNone(self.store.get_revision("Git", len(contents)))
+
+    def test_deleted_entries_keep_their_history(self):
+        self.store.save_entry("Git", "First")
+        self.store.delete_entry("Git")
+        self.assertIsNone(self.store.get_entry("Git"))
+        self.assertEqual(self.store.list_entries(), [])
+
+        self.store.save_entry("Git", "Second")
+        self.assertEqual(self.store.list_entries(), ["Git"])
+        self.assertEqual(self.store.get_revision("Git", 0), "First")
+        self.assertEqual(self.store.get_entry("Git"), "Second")
+
+    def test_interrupted_saves_are_never_read(self):
+        self.store.save_entry("Git", "First")
+        self.store.save_entry("Git", "Second")
+
+        # Leaves a partly written revision behind, as a save interrupted before replacing the head would
+        log = self.store._log("Git")
+        with open(log._segment_path(0), "ab") as f:
+            f.write(b"partial")
+        self.assertEqual(self.store.get_entry("Git"), "Second")
+
+        self.store.save_entry("Git", "Third")
+        self.assertEqual([self.store.get_revision("Git", n) for n in range(3)], ["First", "Second", "Third"])
+
+    def test_titles_never_escape_the_revisions_directory(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        title = os.path.relpath(os.path.join(outside, "escape"), os.path.join(self.media_root, "revisions"))
+        for bad_title in [title, "..", "a/b"]:
+            with self.assertRaises(SuspiciousFileOperation):
+                self.store.save_entry(bad_title, "x")
+        self.assertEqual(os.listdir(outside), [])
+        self.assertEqual(self.client.post("/save_edit", {"title": title, "content": "x"}).status_code, 400)
+        self.assertEqual(os.listdir(outside), [])
+
+        with self.assertRaises(SuspiciousFileOperation):
+            export.entry_path(outside, "../../escape")
+
+    def test_concurrent_saves_are_all_committed(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: self.store.save_entry("Git", f"Revision by writer {i}\n"), range(40)))
+        saved = {self.store.get_revision("Git", n) for n in range(40)}
+        self.assertEqual(saved, {f"Revision by writer {i}\n" for i in range(40)})
+
+    def test_history_pages(self):
+        util.save_entry("Git", "# Git\n\nFirst")
+        util.save_entry("Git", "# Git\n\nSecond")
+        self.assertContains(self.client.get("/wiki/git/history"), "/wiki/Git/revisions/1")
+        self.assertContains(self.client.get("/wiki/Git/revisions/0"), "<p>First</p>")
+        self.assertContains(self.client.get("/wiki/Git/revisions/2"), "Requested revision not found")
+
+
+class PopularityTests(TestCase):
+
+    def setUp(self):
+        render.clear_caches()
+
+    # Views left in the buffer are flushed before the test's transaction is rolled back
+    def tearDown(self):
+        popularity.flush()
+
+    def test_views_are_buffered_and_flushed_in_bulk(self):
+        for _ in range(5):
+            self.client.get("/wiki/Python")
+        self.client.get("/wiki/css")
+        self.assertFalse(PageView.objects.exists())
+        self.assertEqual(popularity.most_viewed(), [("Python", 5), ("CSS", 1)])
+
+        with self.assertNumQueries(5):
+            popularity.flush()
+        self.assertEqual(dict(PageView.objects.values_list("title", "views")), {"Python": 5, "CSS": 1})
+
+        self.client.get("/wiki/CSS")
+        popularity.flush()
+        self.assertEqual(PageView.objects.get(title="CSS").views, 2)
+
+    def test_revalidated_pages_are_counted(self):
+        etag = self.client.get("/wiki/Python")["ETag"]
+        self.assertEqual(self.client.get("/wiki/python", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.get("/wiki/Missing")
+        self.assertEqual(popularity.most_viewed(), [("Python", 2)])
+
+    @override_settings(WIKI_VIEW_FLUSH_INTERVAL=0.01)
+    def test_views_are_flushed_by_a_background_thread(self):
+        flushed = threading.Event()
+        threads = []
+
+        def flush_views():
+            threads.append(threading.current_thread().name)
+            flushed.set()
+
+        with mock.patch.object(util, "flush_views", side_effect=flush_views):
+            self.client.get("/wiki/Python")
+            self.assertTrue(flushed.wait(5))
+
+            # Stops the thread (it exits once the interval is 0)
+            with override_settings(WIKI_VIEW_FLUSH_INTERVAL=0):
+                util._flusher.join(5)
+        self.assertEqual(set(threads), {"wiki-view-flusher"})
+
+    @override_settings(WIKI_WARM_ENTRIES=5)
+    def test_flush_warms_the_render_cache_with_the_most_viewed_entries(self):
+        popularity.record_view("Git")
+        util.flush_views()
+        self.assertIsNotNone(render.get_meta_cache().get(render.title_key("Git")))
+        self.assertContains(self.client.get("/popular"), "Git")
+
+
+class OutlineTests(TestCase):
+
+    CONTENT = "# Git\n\nIntro\n\n## Usage\n\nCommit often\n\n### Tips\n\nUse branches\n\n## Usage\n\nAgain\n\n## R&amp;D\n\nEnd"
+
+    def setUp(self):
+        render.get_cache().clear()
+
+    def test_outline_is_stored_when_an_entry_is_saved(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        with override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root):
+            util.save_entry("Git", self.CONTENT)
+            self.assertEqual(outline.get_outline("Git"), [
+                [1, "Git", "git"], [2, "Usage", "usage"], [3, "Tips", "tips"], [2, "Usage", "usage-2"], [2, "R&D", "rd"]
+            ])
+
+            response = self.client.get("/wiki/Git")
+            self.assertContains(response, '<a href="#usage-2">Usage</a>', html=True)
+            self.assertContains(response, '<h2 id="usage-2">Usage</h2>', html=True)
+
+            util.delete_entry("Git")
+            self.assertEqual(outline.get_outline("Git"), [])
+
+    def test_section_ends_at_the_next_heading_of_the_same_level(self):
+        html_content = render.md_to_html(self.CONTENT)
+        self.assertEqual(outline.section(html_content, "usage"),
+                         "<h2>Usage</h2>\n<p>Commit often</p>\n<h3>Tips</h3>\n<p>Use branches</p>")
+        self.assertEqual(outline.section(html_content, "rd"), "<h2>R&amp;D</h2>\n<p>End</p>")
+        self.assertIsNone(outline.section(html_content, "missing"))
+
+    @override_settings(WIKI_MARKDOWN={"EXTENSIONS": ["toc"], "EXTENSION_CONFIGS": {"toc": {"permalink": True}}})
+    def test_headings_keep_the_ids_set_by_the_toc_extension(self):
+        html_content = render.md_to_html(self.CONTENT)
+        self.assertEqual(outline.extract_outline(html_content), [
+            [1, "Git", "git"], [2, "Usage", "usage"], [3, "Tips", "tips"], [2, "Usage", "usage_1"], [2, "R&D", "rd"]
+        ])
+        self.assertEqual(outline.add_anchors(html_content), html_content)
+        self.assertTrue(outline.section(html_content, "usage_1").startswith('<h2 id="usage_1">Usage<a class="headerlink"'))
+        self.assertTrue(outline.section(html_content, "rd").endswith("<p>End</p>"))
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "entries"))
+        with override_settings(WIKI_EXPORT_DIR=None, MEDIA_ROOT=media_root):
+            util.save_entry("Git", self.CONTENT)
+            response = self.client.get("/wiki/Git")
+            self.assertContains(response, '<a href="#usage_1">Usage</a>', html=True)
+            self.assertEqual(response.content.count(b'id="usage_1"'), 1)
+            self.assertEqual(self.client.get("/wiki/Git/sections/tips").status_code, 200)
+
+    def test_section_endpoint(self):
+        response = self.client.get("/wiki/python/sections/python")
+        self.assertTrue(response.content.startswith(b'<h1 id="python">Python</h1>'))
+        self.assertEqual(self.client.get("/wiki/Python/sections/missing").status_code, 404)
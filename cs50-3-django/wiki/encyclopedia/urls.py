@@ -4,11 +4,22 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("index.json", views.index_json, name="index_json"),
     path("wiki/<str:title>", views.entry, name="entry"),
+    path("wiki/<str:title>/raw", views.raw, name="raw"),
+    path("wiki/<str:title>/html", views.entry_html, name="entry_html"),
+    path("wiki/<str:title>/sections/<str:anchor>", views.entry_section, name="entry_section"),
+    path("wiki/<str:title>/history", views.history, name="history"),
+    path("wiki/<str:title>/revisions/<int:number>", views.revision, name="revision"),
     path("search", views.search, name="search"),
     path("create", views.create, name="create"),
     path("edit", views.edit, name="edit"),
     path("save_edit", views.save_edit, name="save_edit"),
     path("delete", views.delete, name="delete"),
-    path("random", views.randomchoice, name="random")
+    path("random", views.randomchoice, name="random"),
+    path("autocomplete", views.autocomplete, name="autocomplete"),
+    path("broken_links", views.broken_links, name="broken_links"),
+    path("popular", views.popular, name="popular"),
+    path("popular.json", views.popular_json, name="popular_json"),
+    path("cache_stats", views.render_cache_stats, name="cache_stats")
 ]
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import async_views, urls
+
+# Same routes as urls.py, with the pages that have an async version served by it
+urlpatterns = [
+    path("", async_views.index, name="index"),
+    path("wiki/<str:title>", async_views.entry, name="entry"),
+    path("search", async_views.search, name="search"),
+    path("random", async_views.randomchoice, name="random"),
+] + [pattern for pattern in urls.urlpatterns if pattern.name not in ("index", "entry", "search", "random")]
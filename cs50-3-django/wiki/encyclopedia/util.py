@@ -1,27 +1,289 @@
-import re
+import datetime
+import hashlib
+import logging
+import threading
+import time
 
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 
-# Returns a list of all names of encyclopedia entries
+from . import export, links, outline, popularity, render, search_index
+from .catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+_store = None
+
+# Thread adding the page views counted by this process to the database (see record_view)
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+# Returns the entry store configured by the WIKI_ENTRY_STORE setting (created on first use)
+def get_store():
+    global _store
+    if _store is None:
+        config = getattr(settings, "WIKI_ENTRY_STORE", {})
+        backend = import_string(config.get("BACKEND", "encyclopedia.stores.FileSystemEntryStore"))
+        _store = backend(**{key.lower(): value for key, value in config.get("OPTIONS", {}).items()})
+    return _store
+
+
+# Forgets the entry store, so the next call to get_store creates a new one
+def reset_store():
+    global _store
+    _store = None
+
+
+# Forgets the entry store when the settings it depends on change (e.g. in tests using override_settings)
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    if setting in ("WIKI_ENTRY_STORE", "MEDIA_ROOT"):
+        reset_store()
+
+
+# Sorted catalog of all entry titles, shared by every request in this process
+catalog = Catalog(lambda: get_store().list_entries(), lambda: get_store().version())
+
+
+# Returns a list of all names of encyclopedia entries (in alphabetical order)
 def list_entries():
-    _, filenames = default_storage.listdir("entries")
-    return list(sorted(re.sub(r"\.md$", "", filename)
-                for filename in filenames if filename.endswith(".md")))
+    return catalog.titles()
+
+
+# Returns whether an encyclopedia entry with the given title exists
+def has_entry(title):
+    return catalog.contains(title)
+
+
+# Returns the title an encyclopedia entry is stored under, looked up ignoring case (e.g. "python" -> "Python")
+# If no such entry exists, the function returns None.
+def resolve_title(title):
+    return catalog.resolve(title)
+
+
+# Returns the titles of the entries matching a search: the entries whose title or content match the search's words
+# (best BM25 score first, from the store's own full-text index if it has one), followed by the other entries whose
+# title contains the search (ignoring case)
+def search_entries(query, limit=50):
+    if not query.strip():
+        return []
+    store = get_store()
+    matches = store.search(query, limit) if hasattr(store, "search") else search_index.search(query, limit)
+    found = set(matches)
+    matches += [title for title in catalog.containing(query.strip(), limit) if title not in found]
+    return matches[:limit]
+
+
+# Returns the cache key of an entry's metadata (time the entry was saved and hash of its content)
+def _metadata_key(title):
+    return "meta:" + hashlib.sha256(title.encode("utf-8")).hexdigest()
+
+
+# Forgets the remembered hash of an entry's content, and removes the html file rendered for that content
+def _forget_hash(title):
+    metadata = render.get_meta_cache().get(_metadata_key(title))
+    if metadata is not None:
+        render.remove_spooled_html(metadata[1])
+        render.get_meta_cache().delete(_metadata_key(title))
+
+
+# Returns the remembered hash of an entry's content if the entry wasn't saved since, otherwise None (without reading
+# the entry)
+def remembered_hash(title):
+    modified = get_store().modified(title)
+    metadata = render.get_meta_cache().get(_metadata_key(title)) if modified is not None else None
+    if metadata is not None and metadata[0] == modified:
+        return metadata[1]
+    return None
+
+
+# Returns the hash of an entry's content, or None if no such entry exists
+# The hash is remembered for as long as the entry's modification time doesn't change, so the entry is only read once
+# The modification time is read before the entry, so if the entry is saved meanwhile the remembered hash is stale (and
+# is computed again) rather than paired with the new modification time
+def entry_hash(title):
+    modified = get_store().modified(title)
+    if modified is None:
+        return None
+    metadata = render.get_meta_cache().get(_metadata_key(title))
+    if metadata is not None and metadata[0] == modified:
+        return metadata[1]
+
+    # Hashes the entry as a stream, so large entries are never loaded into memory at once
+    f = open_entry(title)
+    if f is None:
+        return None
+    with f:
+        content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+    render.get_meta_cache().set(_metadata_key(title), (modified, content_hash))
+    return content_hash
+
+
+# Reads an entry's markdown and returns it with the hash of its content (None, None if no such entry exists)
+# The hash is remembered like entry_hash's, so reading an entry also spares hashing it again
+def read_entry(title):
+    modified = get_store().modified(title)
+    content = get_entry(title) if modified is not None else None
+    if content is None:
+        return None, None
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    render.get_meta_cache().set(_metadata_key(title), (modified, content_hash))
+    return content, content_hash
+
+
+# Returns the time an entry was last saved, or None if no such entry exists
+def entry_modified(title):
+    modified = get_store().modified(title)
+    if modified is None:
+        return None
+    return datetime.datetime.fromtimestamp(modified, tz=datetime.timezone.utc)
 
 
 # Saves an encyclopedia entry, given its title and Markdown content. If an existing entry with the same title already exists, it is replaced
 def save_entry(title, content):
-    filename = f"entries/{title}.md"
-    if default_storage.exists(filename):
-        default_storage.delete(filename)
-    default_storage.save(filename, ContentFile(content))
+    created = write_entry(title, content)
+    index_entry(title, content, created)
+
+
+# Writes an entry to the store and updates the in-memory indexes (catalog, and forgets the entry's cached hash and html)
+# Can be called from several threads at once. Returns whether the entry is new
+def write_entry(title, content):
+    created = not catalog.contains(title)
+    _forget_hash(title)
+    render.invalidate(title)
+    version = catalog.storage_version()
+    get_store().save_entry(title, content)
+    catalog.add(title, version)
+    return created
+
+
+# Updates the search index, links, outline and the static site export after an entry was written with write_entry
+def index_entry(title, content, created):
+    search_index.index_entry(title, content)
+    links.update_links(title, content)
+
+    # The html rendered for the outline stays in the cache for the entry's next page view
+    outline.update_outline(title, render.md_to_html(content, title))
+
+    # Updates the static site export (see the export_wiki command) if one is configured
+    export_directory = getattr(settings, "WIKI_EXPORT_DIR", None)
+    if export_directory:
+        export.export_entry(export_directory, title, content)
+        if created:
+            export.export_index(export_directory)
+
+
+# Deletes an encyclopedia entry, given its title, along with its cached html, search index postings, links and outline
+def delete_entry(title):
+    version = catalog.storage_version()
+    get_store().delete_entry(title)
+    catalog.remove(title, version)
+    render.invalidate(title)
+    _forget_hash(title)
+    search_index.remove_entry(title)
+    links.remove_links(title)
+    outline.remove_outline(title)
+    popularity.remove_entry(title)
+
+    export_directory = getattr(settings, "WIKI_EXPORT_DIR", None)
+    if export_directory:
+        export.remove_entry(export_directory, title)
+        export.export_index(export_directory)
 
 
 # Retrieves an encyclopedia entry by its title. If no such entry exists, the function returns None.
 def get_entry(title):
-    try:
-        f = default_storage.open(f"entries/{title}.md")
-        return f.read().decode("utf-8")
-    except FileNotFoundError:
+    return get_store().get_entry(title)
+
+
+# Returns the html of an entry's markdown content: the html stored with the entry if the store keeps it (and it was
+# rendered with the current markdown options), otherwise the html rendered by md_to_html, which is then stored
+def entry_html(title, content):
+    store = get_store()
+    if not hasattr(store, "get_html"):
+        return render.md_to_html(content, title)
+    fingerprint = render.options_fingerprint()
+    html_content = store.get_html(title, fingerprint)
+    if html_content is None:
+        html_content = render.md_to_html(content, title)
+        store.save_html(title, content, html_content, fingerprint)
+    return html_content
+
+
+# Opens an encyclopedia entry's markdown as a binary file. If no such entry exists, the function returns None.
+def open_entry(title):
+    return get_store().open_entry(title)
+
+
+# Returns the size of an encyclopedia entry's markdown in bytes. If no such entry exists, the function returns None.
+def entry_size(title):
+    return get_store().size(title)
+
+
+# Returns whether the entry store keeps old revisions of entries
+def keeps_revisions():
+    return hasattr(get_store(), "history")
+
+
+# Returns the (number, time saved, size in bytes) of every revision of an entry, oldest first, or None if the entry
+# store doesn't keep revisions
+def entry_history(title):
+    if not keeps_revisions():
+        return None
+    return [(number, datetime.datetime.fromtimestamp(saved, tz=datetime.timezone.utc), size)
+            for number, saved, size in get_store().history(title)]
+
+
+# Retrieves a revision of an encyclopedia entry. If no such revision exists (or revisions aren't kept), returns None.
+def get_revision(title, number):
+    if not keeps_revisions():
         return None
+    return get_store().get_revision(title, number)
+
+
+# Counts a view of an entry's page in memory. The views are added to the database by a background thread of this
+# process every WIKI_VIEW_FLUSH_INTERVAL seconds (started by the first view), so no request waits for a flush
+def record_view(title):
+    popularity.record_view(title)
+    if _flusher is None or not _flusher.is_alive():
+        _start_flusher()
+
+
+# Starts the thread flushing the views counted by this process, unless WIKI_VIEW_FLUSH_INTERVAL is 0 (views are then
+# only added to the database when flush_views is called)
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if settings.WIKI_VIEW_FLUSH_INTERVAL and (_flusher is None or not _flusher.is_alive()):
+            _flusher = threading.Thread(target=_flush_periodically, name="wiki-view-flusher", daemon=True)
+            _flusher.start()
+
+
+# Flushes the views every WIKI_VIEW_FLUSH_INTERVAL seconds (until the setting is changed to 0)
+def _flush_periodically():
+    while settings.WIKI_VIEW_FLUSH_INTERVAL:
+        time.sleep(settings.WIKI_VIEW_FLUSH_INTERVAL)
+        try:
+            flush_views()
+        except Exception:
+            logger.exception("Couldn't add the page views to the database")
+        finally:
+            connection.close()
+
+
+# Adds the views counted so far to the database, then renders the most viewed entries into the html cache (only those
+# whose html isn't cached are read), so the pages most likely to be requested next are ready
+def flush_views():
+    popularity.flush()
+    titles = [title for title in popularity.hot_entries(settings.WIKI_WARM_ENTRIES) if has_entry(title)]
+    keys = render.get_meta_cache().get_many([render.title_key(title) for title in titles])
+    for title in titles:
+        key = keys.get(render.title_key(title))
+        if key is None or not render.get_cache().has_key(key):
+            md_content = get_entry(title)
+            if md_content is not None:
+                render.md_to_html(md_content, title)
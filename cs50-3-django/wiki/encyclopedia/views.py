@@ -1,27 +1,154 @@
-from django.shortcuts import render
-import markdown
+import functools
 import os
-import random
 
-from . import util
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from . import compression, links, outline, popularity, search_index, streaming, util
+from .render import md_to_html, cache_stats, compressed_html, options_fingerprint, spool_html, spooled_html_path
 
 
-# Converts markdown content to html
-def md_to_html(md_content):
-    markdowner = markdown.Markdown()
-    return markdowner.convert(md_content)
-    
+# ETag of the homepage's entries as JSON (changes whenever an entry is added or removed)
+def index_etag(request):
+    return util.catalog.fingerprint()
+
+
+# ETag of the homepage: weak, since every page embeds a new CSRF token, so pages are never byte-identical
+def index_page_etag(request):
+    return f'W/"{index_etag(request)}"'
+
+
+# Version of an entry's html (derived from the entry's content and the markdown options used to render it), or None
+# if no such entry exists
+def entry_version(title):
+    title = util.resolve_title(title)
+    content_hash = util.entry_hash(title) if title else None
+    if content_hash is None:
+        return None
+    return f"{content_hash}-{options_fingerprint()}"
+
+
+# ETag of an entry page, given the hash of the entry's content: derived from the entry's html and the entries linking
+# to it ("What links here"), so it changes when another entry starts or stops linking to it. Weak, since every page
+# embeds a new CSRF token, so pages are never byte-identical
+def entry_page_etag(title, content_hash):
+    return f'W/"{content_hash}-{options_fingerprint()}-{links.backlinks_fingerprint(title)}"'
+
+
+# ETag checked against revalidations of an entry page. It is only known once the entry's hash is remembered: hashing
+# the entry here would read it a second time, since the page reads it anyway (and then sends the ETag itself)
+def entry_etag(request, title):
+    title = util.resolve_title(title)
+    content_hash = util.remembered_hash(title) if title else None
+    if content_hash is None:
+        return None
+    return entry_page_etag(title, content_hash)
+
+
+# Time an entry was last saved (sent as the Last-Modified of the entry's html, sections and markdown source)
+def entry_last_modified(request, title):
+    title = util.resolve_title(title)
+    return util.entry_modified(title) if title else None
+
+
+# Renders the page of an entry (its html content with anchors on its headings, its table of contents and the entries
+# linking to it)
+def entry_page(request, title, md_content):
+    return render(request, "encyclopedia/entry.html", {
+        "title": title,
+        "content": outline.add_anchors(util.entry_html(title, md_content)),
+        "outline": outline.get_outline(title),
+        "backlinks": links.backlinks(title)
+    })
 
-# Displays the homepage with list of encyclopedia entries (in alphabetical order)
+
+# Streams the page of a large entry from its html file, rendering the entry into the file first if needed
+# Returns None if large entries aren't streamed (no WIKI_HTML_SPOOL_DIR)
+def streamed_entry_page(request, title):
+    content_hash = util.entry_hash(title)
+    html_path = spooled_html_path(content_hash) if content_hash else None
+    if html_path is None:
+        return None
+
+    # The entry is hashed again as it is read, so the file is named after the content actually rendered even if the
+    # entry was saved since it was hashed
+    if not os.path.exists(html_path):
+        md_content, content_hash = util.read_entry(title)
+        if md_content is None:
+            return None
+        html_path = spool_html(content_hash, lambda: md_content)
+    response = streaming.stream_template(request, "encyclopedia/entry.html", {
+        "title": title,
+        "outline": outline.get_outline(title),
+        "backlinks": links.backlinks(title)
+    }, html_path)
+    response["ETag"] = entry_page_etag(title, content_hash)
+    return response
+
+
+# Returns a page of entry titles (in alphabetical order) given the "after" cursor (last title of the previous page) and
+# "letter" (first letter of the titles) query parameters, along with the cursor of the next page
+def index_page(request):
+    after = request.GET.get("after")
+    letter = request.GET.get("letter")
+    entries, next_cursor = util.catalog.page(after, letter, settings.WIKI_INDEX_PAGE_SIZE)
+    return {
+        "entries": entries,
+        "next": next_cursor,
+        "letter": letter
+    }
+
+
+# Displays the homepage with a page of encyclopedia entries (in alphabetical order, optionally only the entries
+# starting with a letter), with links to the next page and to each letter
+# Browsers and caches holding the current version of the page get a 304 response instead
+@condition(etag_func=index_page_etag)
 def index(request):
     return render(request, "encyclopedia/index.html", {
-        "entries": util.list_entries()
+        **index_page(request),
+        "letters": util.catalog.letters()
     })
 
 
+# Returns a page of encyclopedia entries as JSON (same query parameters as the homepage)
+@condition(etag_func=index_etag)
+def index_json(request):
+    return JsonResponse(index_page(request))
+
+
+# Counts a view of an entry's page (see util.record_view) when the page is sent, and when a browser revalidates its
+# copy of the page (304), so entries mostly served from browser caches are counted too
+def counts_views(view):
+    @functools.wraps(view)
+    def inner(request, title):
+        response = view(request, title)
+        if response.status_code in (200, 304):
+            entry_title = util.resolve_title(title)
+            if entry_title:
+                util.record_view(entry_title)
+        return response
+    return inner
+
+
 # Displays the encyclopedia entry page for a specific title
+# Browsers and caches holding the current version of the entry get a 304 response without the entry being read or rendered
+# (there is no Last-Modified: the page also lists the entries linking to it, which change without the entry changing)
+# The entry is read at most once per request: its hash is computed from the content read for the page
+@counts_views
+@condition(etag_func=entry_etag)
 def entry(request, title):
-    md_content = util.get_entry(title)
+    title = util.resolve_title(title)
+
+    # Streams the pages of large entries instead of loading them into memory
+    if title and (util.entry_size(title) or 0) >= settings.WIKI_STREAM_THRESHOLD:
+        response = streamed_entry_page(request, title)
+        if response is not None:
+            return response
+
+    md_content, content_hash = util.read_entry(title) if title else (None, None)
 
     # If entry page does not exist, displays an error message
     if md_content == None:
@@ -30,36 +157,127 @@ def entry(request, title):
         })
     # If entry page exists, displays the entry's page
     else:
-        html_content = md_to_html(md_content)
-        return render(request, "encyclopedia/entry.html", {
-            "title": title, 
-            "content": html_content
+        response = entry_page(request, title, md_content)
+        response["ETag"] = entry_page_etag(title, content_hash)
+        return response
+
+
+# ETag of an entry's html (strong, and different for each content encoding since each is a different representation)
+def entry_html_etag(request, title):
+    version = entry_version(title)
+    if version is None:
+        return None
+    return f"{version}-{compression.choose_encoding(request.headers.get('Accept-Encoding', '')) or 'identity'}"
+
+
+# Returns the html of an entry (without the rest of the page), for lightweight clients and caches
+# The html is compressed the first time it is requested with an encoding, and served compressed to clients accepting it
+@vary_on_headers("Accept-Encoding")
+@condition(etag_func=entry_html_etag, last_modified_func=entry_last_modified)
+def entry_html(request, title):
+    title = util.resolve_title(title)
+    md_content = util.get_entry(title) if title else None
+    if md_content is None:
+        return HttpResponseNotFound("Requested page not found")
+
+    encoding = compression.choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return HttpResponse(md_to_html(md_content, title))
+    data, original_size = compressed_html(md_content, encoding, title)
+    compression.record_served(encoding, original_size, len(data))
+    response = HttpResponse(data)
+    response["Content-Encoding"] = encoding
+    return response
+
+
+# ETag and Last-Modified of a section of an entry (those of the entry's html)
+def section_etag(request, title, anchor):
+    return entry_version(title)
+
+
+def section_last_modified(request, title, anchor):
+    return entry_last_modified(request, title)
+
+
+# Returns the html of one section of an entry (a heading and its content, up to the next heading of the same level),
+# given the section's anchor from the entry's table of contents, for clients that only need part of a long entry
+# The section is cut from the entry's cached html, so the markdown isn't parsed again
+@condition(etag_func=section_etag, last_modified_func=section_last_modified)
+def entry_section(request, title, anchor):
+    title = util.resolve_title(title)
+    md_content = util.get_entry(title) if title else None
+    section = outline.section(md_to_html(md_content, title), anchor) if md_content is not None else None
+    if section is None:
+        return HttpResponseNotFound("Requested section not found")
+    return HttpResponse(outline.add_anchors(section))
+
+
+# ETag of an entry's markdown source (hash of the source)
+def raw_etag(request, title):
+    title = util.resolve_title(title)
+    return util.entry_hash(title) if title else None
+
+
+# Returns an entry's markdown source, streamed in chunks (supports Range requests for parts of the source)
+@condition(etag_func=raw_etag, last_modified_func=entry_last_modified)
+def raw(request, title):
+    title = util.resolve_title(title)
+    f = util.open_entry(title) if title else None
+    if f is None:
+        return HttpResponseNotFound("Requested page not found")
+    etag = f'"{raw_etag(request, title)}"'
+    return streaming.ranged_response(request, f, util.entry_size(title), "text/markdown; charset=utf-8", etag)
+
+
+# Displays the revisions of an entry (newest first), with links to each revision
+def history(request, title):
+    title = util.resolve_title(title)
+    revisions = util.entry_history(title) if title else None
+    if not revisions:
+        return render(request, "encyclopedia/error.html", {
+            "message": "No revisions are kept for this page" if title else "Requested page not found"
+        })
+    return render(request, "encyclopedia/history.html", {
+        "title": title,
+        "revisions": reversed(revisions)
+    })
+
+
+# Displays an old revision of an entry (read from its revision log, without reading other revisions' segments)
+def revision(request, title, number):
+    title = util.resolve_title(title)
+    md_content = util.get_revision(title, number) if title else None
+    if md_content is None:
+        return render(request, "encyclopedia/error.html", {
+            "message": "Requested revision not found"
         })
+    return render(request, "encyclopedia/revision.html", {
+        "title": title,
+        "number": number,
+        "content": md_to_html(md_content)
+    })
 
 
 # Displays the encyclopedia entry page or search results page for the user's search
 def search(request):
 
-    # Gets list of all entries & the user's search
-    entrylist = util.list_entries()
-    search = request.POST["q"]
-
-    # Displays the encyclopedia entry page if the search result matches a valid entry
-    if util.get_entry(search) is not None:
-        md_content = util.get_entry(search)
-        html_content = md_to_html(md_content)
-        return render(request, "encyclopedia/entry.html", {
-            "title": search,
-            "content": html_content
-        })
-    # Otherwise displays the search results page with a list of entries that match the query as a substring
+    # Gets the user's search (posted by the search box, or in the query string from exported static pages)
+    search = request.POST["q"] if request.method == "POST" else request.GET.get("q", "")
+
+    # Displays the encyclopedia entry page if the search result matches a valid entry (ignoring case)
+    title = util.resolve_title(search)
+    md_content = util.get_entry(title) if title else None
+    if md_content is not None:
+        return entry_page(request, title, md_content)
+    # Otherwise displays the search results page with the entries whose title or content match the query (best match first)
+    # with a highlighted snippet of each, and the titles similar to the query (in case of typos)
     else:
-        validentries = []
-        for entry in entrylist:
-            if search.lower() in entry.lower():
-                validentries.append(entry)
+        validentries = util.search_entries(search)
+        snippets = search_index.snippets(validentries, search)
+        suggestions = [title for title in util.catalog.similar(search) if title not in validentries]
         return render(request, "encyclopedia/search.html", {
-                "entries": validentries
+                "entries": [(title, snippets.get(title)) for title in validentries],
+                "suggestions": suggestions
             })
     
 
@@ -69,24 +287,19 @@ def create(request):
     # POST -  User submits the form (title and content) to create a new entry page
     if request.method == "POST":
 
-        # Gets list of all current entries & the user's title and content for the new entry page
-        entrylist = util.list_entries()
+        # Gets the user's title and content for the new entry page
         title = request.POST["title"].capitalize()
         md_content = request.POST["content"]
 
-        # If entry already exists, displays an error message
-        if title in entrylist:
+        # If entry already exists (ignoring case), displays an error message
+        if util.resolve_title(title) is not None:
             return render(request, "encyclopedia/error.html", {
             "message": "Entry already exists"
         })
         # If entry does not exist, saves the entry and redirects user to the new entry's page
         else:
             util.save_entry(title, md_content)
-            html_content = md_to_html(md_content)
-            return render(request, "encyclopedia/entry.html", {
-                "title": title,
-                "content": html_content
-            })
+            return entry_page(request, title, md_content)
 
     # GET - User reaches the create a new entry page
     else:
@@ -98,27 +311,36 @@ def edit(request):
 
     # POST - Takes the user's request to edit a specific entry title to render the edit page
     if request.method == "POST":
-        title = request.POST["title"]
+        title = util.resolve_title(request.POST["title"]) or request.POST["title"]
         md_content = util.get_entry(title)
         return render(request, "encyclopedia/edit.html", {
             "title": title,
             "content": md_content
         })
+
+    # GET - Renders the edit page for the entry title in the query string (linked from exported static pages)
+    else:
+        title = util.resolve_title(request.GET.get("title", ""))
+        if title is None:
+            return render(request, "encyclopedia/error.html", {
+                "message": "Requested page not found"
+            })
+        return render(request, "encyclopedia/edit.html", {
+            "title": title,
+            "content": util.get_entry(title)
+        })
     
 
 # Allows the user to save edits for an entry page
 def save_edit(request):
     
     # POST - Saves the edits made to the title and content for a specific entry page
+    # (an existing entry whose title only differs in case is replaced instead of adding a duplicate)
     if request.method == "POST":
-        title = request.POST["title"]
+        title = util.resolve_title(request.POST["title"]) or request.POST["title"]
         md_content = request.POST["content"]
         util.save_entry(title, md_content)
-        html_content = md_to_html(md_content)
-        return render(request, "encyclopedia/entry.html", {
-            "title": title,
-            "content": html_content
-        })
+        return entry_page(request, title, md_content)
 
 
 # Allows the user delete an entry page 
@@ -128,39 +350,93 @@ def delete(request):
     if request.method == "POST":
 
         # Gets title of entry to delete
-        title = request.POST["title"]
+        title = util.resolve_title(request.POST["title"]) or request.POST["title"]
 
         # Deletes the entry file
-        os.remove(f"entries/{title}.md")
+        util.delete_entry(title)
         
         # Returns the user to the homepage
         return render(request, "encyclopedia/index.html", {
-        "entries": util.list_entries()
+        **index_page(request),
+        "letters": util.catalog.letters()
+        })
+
+    # GET - Asks the user to confirm deleting the entry title in the query string (linked from exported static pages)
+    else:
+        title = util.resolve_title(request.GET.get("title", ""))
+        if title is None:
+            return render(request, "encyclopedia/error.html", {
+                "message": "Requested page not found"
+            })
+        return render(request, "encyclopedia/delete.html", {
+            "title": title
         })
     
 
 # Displays a random entry page to the user
 def randomchoice(request):
 
-    # Gets the list of all entries and selects a random one
-    entrylist = util.list_entries()
-    entry = random.choice(entrylist)
+    # Selects a random entry from the catalog and reads only that entry
+    # (tries again if the entry was deleted in the meantime)
+    md_content = None
+    for _ in range(3):
+        entry = util.catalog.random_title()
+        if entry is None:
+            break
+        md_content = util.get_entry(entry)
+        if md_content is not None:
+            break
+
+    # If there are no entries, displays an error message
+    if md_content is None:
+        return render(request, "encyclopedia/error.html", {
+            "message": "There are no entries yet"
+        })
 
     # Displays the title and contents of the random entry to the user
-    md_content = util.get_entry(entry)
-    html_content = md_to_html(md_content)
-    return render(request, "encyclopedia/entry.html", {
-        "title": entry,
-        "content": html_content
+    return entry_page(request, entry, md_content)
+
+
+# Displays the most viewed entries
+def popular(request):
+    return render(request, "encyclopedia/popular.html", {
+        "entries": popularity.most_viewed()
     })
-        
 
 
+# Returns the most viewed entries and their views as JSON (?limit= sets how many, up to 500)
+def popular_json(request):
+    try:
+        limit = min(max(int(request.GET.get("limit", 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    return JsonResponse({
+        "entries": [{"title": title, "views": views} for title, views in popularity.most_viewed(limit)]
+    })
 
 
-    
-    
-    
+# Displays the links to entries that don't exist (linking entry and linked title)
+def broken_links(request):
+    return render(request, "encyclopedia/broken_links.html", {
+        "links": links.broken_links(util.resolve_title)
+    })
 
 
+# Returns the hit/miss/eviction counters of the rendered html cache (used to size the cache)
+def render_cache_stats(request):
+    return JsonResponse({
+        **cache_stats(),
+        "compression": compression.compression_stats()
+    })
+
 
+# Returns the titles starting with the user's partial search as JSON (used to autocomplete the search box)
+def autocomplete(request):
+    prefix = request.GET.get("q", "")
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    return JsonResponse({
+        "results": util.catalog.complete(prefix, limit) if prefix else []
+    })
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'encyclopedia.middleware.asgi_urlconf_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +64,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'encyclopedia.context_processors.revisions',
             ],
         },
     },
@@ -82,6 +84,98 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+# The "markdown" cache holds the rendered html of encyclopedia entries, keyed by a hash of the markdown source
+# (least recently used entries are evicted once MAX_ENTRIES is reached)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'markdown': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rendered-markdown',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # Html of the top-level blocks of entries (paragraphs, headings, lists...), kept apart from the entries' html
+    'markdown_blocks': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rendered-markdown-blocks',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Html of entries compressed with gzip/brotli for /wiki/<title>/html, kept apart from the entries' html
+    'markdown_compressed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rendered-markdown-compressed',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # Which html belongs to each entry and the hash of each entry's content, kept apart from the entries' html
+    'markdown_meta': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rendered-markdown-meta',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
+# Encyclopedia entry storage
+# FileSystemEntryStore keeps each entry as entries/<title>.md. To keep all entries in a single SQLite database
+# instead, use 'encyclopedia.stores.SQLiteEntryStore' with OPTIONS {'PATH': os.path.join(BASE_DIR, 'entries.sqlite3')}
+# and copy the existing entries into it with `python manage.py migrate_entries`. To keep every revision of each entry
+# (shown on its history page), use 'encyclopedia.stores.RevisionEntryStore' and copy the existing entries into it with
+# `python manage.py migrate_entries --store revisions`
+
+WIKI_ENTRY_STORE = {
+    'BACKEND': 'encyclopedia.stores.FileSystemEntryStore',
+}
+
+# Markdown options used to render entries (each thread reuses one converter built with these options), e.g.
+# 'EXTENSIONS': ['tables', 'fenced_code', 'toc'] and 'EXTENSION_CONFIGS': {'toc': {'permalink': True}}
+WIKI_MARKDOWN = {
+    'EXTENSIONS': [],
+    'EXTENSION_CONFIGS': {},
+}
+
+# Number of entries listed on each page of the homepage
+WIKI_INDEX_PAGE_SIZE = 100
+
+# Entries larger than WIKI_STREAM_THRESHOLD bytes are rendered once into a file in WIKI_HTML_SPOOL_DIR, and their
+# pages are streamed from that file instead of being built in memory
+WIKI_STREAM_THRESHOLD = 1024 * 1024
+WIKI_HTML_SPOOL_DIR = os.path.join(BASE_DIR, 'html_spool')
+
+# URLconf used for requests served through ASGI (wiki/asgi.py): it routes the homepage, entry, search and random pages
+# to async views (encyclopedia/async_views.py), which read entries and render markdown off the event loop.
+# None serves every request with the sync views
+WIKI_ASGI_URLCONF = 'wiki.urls_asgi'
+
+# Number of threads rendering markdown for the async views
+WIKI_RENDER_WORKERS = 4
+
+# Entry page views are counted in memory and added to the database every WIKI_VIEW_FLUSH_INTERVAL seconds by a background
+# thread of each process (0 disables the thread). After each flush, the WIKI_WARM_ENTRIES most viewed entries are
+# rendered into the html cache if they aren't in it
+WIKI_VIEW_FLUSH_INTERVAL = 10
+WIKI_WARM_ENTRIES = 20
+
+# Directory of the static site export (see `python manage.py export_wiki`). When set, saving or deleting an entry
+# also updates its exported page
+WIKI_EXPORT_DIR = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
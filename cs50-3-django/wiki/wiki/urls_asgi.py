@@ -0,0 +1,11 @@
+"""wiki URL Configuration for requests served through ASGI
+
+Same as wiki/urls.py, with the encyclopedia's async views (see WIKI_ASGI_URLCONF in settings.py).
+"""
+from django.contrib import admin
+from django.urls import include, path
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include("encyclopedia.urls_async"))
+]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0027_alter_listing_winner'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'title', 'id'], name='listing_active_title_id'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['category', 'is_active', 'title', 'id'], name='listing_category_title_id'),
+        ),
+    ]
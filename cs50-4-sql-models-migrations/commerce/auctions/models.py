@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
 
 
 # Model for user database (username, email, password)
@@ -24,6 +26,52 @@ class Bid(models.Model):
         return f"${self.highest_bid:.2f} bid made by {self.user}"
 
 
+# QuerySet for auction listings (used by Listing.objects and every related manager, e.g. user.user_watchlist)
+# Listings are ordered by the database, and for_cards() joins everything the listing cards show, so rendering a list
+# page runs the same number of queries whatever the number of listings
+class ListingQuerySet(models.QuerySet):
+
+    # Listings still open for bidding
+    def active(self):
+        return self.filter(is_active=True)
+
+    # Closed listings
+    def inactive(self):
+        return self.filter(is_active=False)
+
+    # Listings in alphabetical order by title (by id for listings with the same title, so the order is stable)
+    def by_title(self):
+        return self.order_by("title", "id")
+
+    # Listings in alphabetical order, with their highest bid (and its bidder), category, owner and winner
+    def for_cards(self):
+        return self.select_related("current_highest_bid__user", "category", "owner", "winner").by_title()
+
+    # Listings after the one with the given title and id, in the order of by_title()
+    def after(self, title, id):
+        return self.filter(title__gte=title).filter(Q(title__gt=title) | Q(id__gt=id))
+
+    # Returns a page of up to size listings in the order of for_cards(), starting after the (title, id) cursor of the
+    # previous page's last listing, along with the cursor of the next page (None on the last page)
+    # Pages are found with an index range scan from the cursor, so any page takes the same time however deep it is
+    def page(self, cursor=None, size=24):
+        listings = self.for_cards()
+        if cursor is not None:
+            listings = listings.after(*cursor)
+        listings = list(listings[:size + 1])
+        if len(listings) > size:
+            return listings[:size], (listings[size - 1].title, listings[size - 1].id)
+        return listings, None
+
+    # Adds current_price: the highest bid, or the initial price if no bid was made yet
+    def with_current_price(self):
+        return self.annotate(current_price=Coalesce("current_highest_bid__highest_bid", "initial_price"))
+
+    # Adds watcher_count: the number of users watching each listing
+    def with_watcher_count(self):
+        return self.annotate(watcher_count=Count("watchlist", distinct=True))
+
+
 # Model for auction listings database (each listing includes a title, description, image url, initial price, current highest bid
 # category, is active/inactive in the listings, in which users' watchlists, owner of the posting)
 class Listing(models.Model):
@@ -38,6 +86,15 @@ class Listing(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name="listing_user")
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name="listing_winner", default=None)
 
+    objects = ListingQuerySet.as_manager()
+
+    # Indexes for paging through active listings (and active listings of a category) in title order
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_active", "title", "id"], name="listing_active_title_id"),
+            models.Index(fields=["category", "is_active", "title", "id"], name="listing_category_title_id"),
+        ]
+
     def __str__(self):
         return self.title
     
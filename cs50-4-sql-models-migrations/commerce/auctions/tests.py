@@ -1,3 +1,155 @@
-from django.test import TestCase
+import base64
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .models import User, Category, Listing, Bid
+
+
+class ListingQuerySetTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.category = Category.objects.create(category_name="Books")
+
+    # Creates count listings owned by the owner, each with a highest bid by the bidder and in the bidder's watchlist
+    def create_listings(self, count, is_active=True):
+        for i in range(count):
+            bid = Bid.objects.create(highest_bid=20 + i, user=self.bidder)
+            listing = Listing.objects.create(
+                title=f"Listing {count - i:03d}",
+                description="Description",
+                image_url="",
+                initial_price=10,
+                current_highest_bid=bid,
+                category=self.category,
+                is_active=is_active,
+                owner=self.owner,
+                winner=None if is_active else self.bidder
+            )
+            listing.watchlist.add(self.bidder)
+
+    # Returns the number of queries run to render a page
+    def count_queries(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_for_cards_orders_by_title_in_the_database(self):
+        self.create_listings(5)
+        Listing.objects.create(title="Listing 003", description="", image_url="", initial_price=1, owner=self.owner)
+        listings = list(Listing.objects.for_cards())
+        self.assertEqual([listing.title for listing in listings], sorted(listing.title for listing in listings))
+        duplicates = [listing.id for listing in listings if listing.title == "Listing 003"]
+        self.assertEqual(duplicates, sorted(duplicates))
+
+    def test_annotations(self):
+        self.create_listings(2)
+        Listing.objects.create(title="No bids", description="", image_url="", initial_price=5, owner=self.owner)
+        listings = {listing.title: listing for listing in Listing.objects.with_current_price().with_watcher_count()}
+        self.assertEqual(listings["No bids"].current_price, 5)
+        self.assertEqual(listings["Listing 002"].current_price, 20)
+        self.assertEqual(listings["Listing 002"].watcher_count, 1)
+        self.assertEqual(listings["No bids"].watcher_count, 0)
+
+    def test_list_pages_run_a_constant_number_of_queries(self):
+        pages = [
+            ("owner", "get", "/", None),
+            ("owner", "post", "/category_listing", {"category": "Books"}),
+            ("owner", "get", "/your_listings", None),
+            ("owner", "post", "/your_listings", {"listing_type": "active"}),
+            ("bidder", "get", "/watchlist", None),
+            ("bidder", "get", "/bidlist", None),
+            ("bidder", "get", "/auctions_won", None),
+        ]
+        self.create_listings(2)
+        self.create_listings(2, is_active=False)
+        few = {}
+        for username, method, path, data in pages:
+            self.client.force_login(User.objects.get(username=username))
+            few[path, method] = self.count_queries(method, path, data)
+
+        self.create_listings(20)
+        self.create_listings(20, is_active=False)
+        for username, method, path, data in pages:
+            self.client.force_login(User.objects.get(username=username))
+            self.assertEqual(self.count_queries(method, path, data), few[path, method], path)
+
+    def test_close_listing_runs_a_constant_number_of_queries(self):
+        self.create_listings(2)
+        self.client.force_login(self.owner)
+        few = self.count_queries("get", f"/close_listing/{Listing.objects.first().id}")
+
+        self.create_listings(20)
+        self.assertEqual(self.count_queries("get", f"/close_listing/{Listing.objects.active().first().id}"), few)
+
+
+@override_settings(AUCTIONS_PAGE_SIZE=5)
+class ListingPaginationTests(TestCase):
+
+    def setUp(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "password")
+        self.books = Category.objects.create(category_name="Books")
+        games = Category.objects.create(category_name="Games")
+        for i in range(23):
+            Listing.objects.create(title=f"Listing {i % 10}", description="", image_url="", initial_price=1,
+                                   category=self.books if i % 3 else games, is_active=i != 7, owner=owner)
+
+    # Follows the "next" cursors of the JSON pages and returns the ids of every listing seen
+    def walk_pages(self, query=""):
+        ids = []
+        cursor = None
+        while True:
+            response = self.client.get("/listings.json?" + query + (f"&after={cursor}" if cursor else "")).json()
+            self.assertLessEqual(len(response["listings"]), 5)
+            ids.extend(listing["id"] for listing in response["listings"])
+            cursor = response["next"]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_active_listing_once_in_order(self):
+        expected = list(Listing.objects.active().order_by("title", "id").values_list("id", flat=True))
+        self.assertEqual(self.walk_pages(), expected)
+
+        expected = list(Listing.objects.active().filter(category=self.books).order_by("title", "id").values_list("id", flat=True))
+        self.assertEqual(self.walk_pages("category=Books"), expected)
+
+    def test_deep_pages_run_the_same_queries_as_the_first(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get("/")
+        cursor = response.context["next"]
+        for _ in range(4):
+            with CaptureQueriesContext(connection) as deep:
+                response = self.client.get("/", {"after": cursor})
+            cursor = response.context["next"]
+            self.assertEqual(len(deep), len(first))
+        self.assertEqual(len(response.context["listings"]), 2)
+        self.assertIsNone(cursor)
+
+    def test_category_pages_link_to_the_next_page(self):
+        response = self.client.post("/category_listing", {"category": "Books"})
+        self.assertContains(response, "?category=Books&after=")
+        response = self.client.get("/category_listing", {"category": "Books", "after": response.context["next"]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursors_show_the_first_page(self):
+        first = [listing.id for listing in self.client.get("/").context["listings"]]
+        self.assertEqual([listing.id for listing in self.client.get("/", {"after": "not a cursor"}).context["listings"]], first)
+        self.assertEqual(self.client.get("/listings.json", {"category": "Missing"}).status_code, 404)
+
+    def test_crafted_cursors_show_the_first_page(self):
+        first = [listing.id for listing in self.client.get("/").context["listings"]]
+        for cursor in ['["a", 1e999]', '["a", 1.5]', '["a", true]', '["a", 99999999999999999999999]', '[1, 1]',
+                       '["a", "1"]', '{"a": 1}']:
+            after = base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii")
+            response = self.client.get("/", {"after": after})
+            self.assertEqual([listing.id for listing in response.context["listings"]], first, cursor)
+
+    def test_unknown_categories_show_the_category_select_page(self):
+        response = self.client.get("/category_listing", {"category": "Nope"})
+        self.assertContains(response, "Please select a valid category", status_code=404)
+        self.assertTemplateUsed(response, "auctions/category.html")
+        self.assertContains(self.client.post("/category_listing"), "Please select a valid category")
@@ -1,25 +1,82 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+import base64
+import binascii
 import datetime
+import json
 
 from .models import User, Category, Listing, Comment, Bid
 
 
-# Allows the user to view the homepage with all active listings
+# Encodes the (title, id) of the last listing of a page as the cursor of the next page (used in URLs)
+def encode_cursor(cursor):
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+
+# Decodes the cursor of the "after" query parameter (the first page is shown if it is missing or invalid)
+# Only a string title and an integer id that fits in a database integer are accepted (e.g. not 1.5, true or 1e999)
+def decode_cursor(request):
+    try:
+        title, id = json.loads(base64.urlsafe_b64decode(request.GET["after"].encode("ascii")))
+    except (KeyError, ValueError, TypeError, OverflowError, binascii.Error):
+        return None
+    if not isinstance(title, str) or type(id) is not int or not -2 ** 63 <= id < 2 ** 63:
+        return None
+    return (title, id)
+
+
+# Returns a page of the active listings (of a category, if given), along with the cursor of the next page
+def active_listings_page(request, category=None):
+    active_listings = Listing.objects.active()
+    if category is not None:
+        active_listings = active_listings.filter(category=category)
+    listings, next_cursor = active_listings.page(decode_cursor(request), settings.AUCTIONS_PAGE_SIZE)
+    return listings, encode_cursor(next_cursor)
+
+
+# Allows the user to view the homepage with the active listings, a page at a time
 def index(request):
 
-    # Gets all active listings (sorted by alphabetical order by title)
-    active_listings = Listing.objects.filter(is_active=True)
-    sorted_active_listings = sorted(active_listings, key=lambda listing: listing.title)
+    # Gets a page of active listings (sorted by alphabetical order by title)
+    active_listings, next_cursor = active_listings_page(request)
 
-    # Renders the homepage with all active listings
+    # Renders the homepage with the page of active listings
     return render(request, "auctions/index.html",
     {
-        "listings": sorted_active_listings
+        "listings": active_listings,
+        "next": next_cursor
+    })
+
+
+# Returns a page of the active listings (of a category, if the category query parameter is given) as JSON
+def listings_json(request):
+    category = request.GET.get("category", None)
+    category_data = Category.objects.filter(category_name=category).first() if category else None
+    if category and category_data is None:
+        return JsonResponse({"error": "Category not found"}, status=404)
+
+    active_listings, next_cursor = active_listings_page(request, category_data)
+    return JsonResponse({
+        "listings": [{
+            "id": listing.id,
+            "title": listing.title,
+            "description": listing.description,
+            "image_url": listing.image_url,
+            "initial_price": listing.initial_price,
+            "highest_bid": listing.current_highest_bid.highest_bid if listing.current_highest_bid else None,
+            "highest_bidder": listing.current_highest_bid.user.username
+                if listing.current_highest_bid and listing.current_highest_bid.user else None,
+            "category": listing.category.category_name if listing.category else None,
+            "owner": listing.owner.username if listing.owner else None
+        } for listing in active_listings],
+        "next": next_cursor
     })
 
 
@@ -117,8 +174,7 @@ def listing(request, id):
 def category(request):
 
     # Gets all categories avaliable (sorted in alphabetical order by category name)
-    all_categories = Category.objects.all()
-    sorted_all_categories = sorted(all_categories, key=lambda category: category.category_name)
+    sorted_all_categories = Category.objects.order_by("category_name")
 
     # Shows user page to select from all categories avaliable
     return render(request, "auctions/category.html",
@@ -131,28 +187,27 @@ def category(request):
 def category_listing(request):
 
     # Gets all categories avaliable (sorted in alphabetical order by category name)
-    all_categories = Category.objects.all()
-    sorted_all_categories = sorted(all_categories, key=lambda category: category.category_name)
+    sorted_all_categories = Category.objects.order_by("category_name")
 
-    # If no category is selected, displays an error message
-    if not request.POST.get("category", None):
+    # The category is chosen with the form (POST), or given in the links to the next pages (GET)
+    category = request.POST.get("category", None) or request.GET.get("category", None)
+
+    # Retrieves the category selected (None if it doesn't exist, e.g. in an old link)
+    category_data = Category.objects.filter(category_name=category).first() if category else None
+
+    # If no valid category is selected, displays an error message (with a 404 status for an unknown category)
+    if category_data is None:
         return render(request, "auctions/category.html",
         {
             "categories": sorted_all_categories,
             "message_red_alert": "Please select a valid category"
-        })
-    
-    # Retrieves the category selected 
-    category = request.POST.get("category", None)
-    category_data = Category.objects.get(category_name=category)
+        }, status=404 if category else 200)
 
     # Retrieves the other categories to choose from (sorted in alphabetical order by category name)
-    other_category_data = Category.objects.exclude(category_name=category)
-    sorted_other_category_data = sorted(other_category_data, key=lambda category: category.category_name)
+    sorted_other_category_data = Category.objects.exclude(category_name=category).order_by("category_name")
 
-    # Gets all listings within the choosen category (sorted in alphabetical order by title)
-    active_listings = Listing.objects.filter(category=category_data, is_active=True)
-    sorted_active_listings = sorted(active_listings, key=lambda listing: listing.title)
+    # Gets a page of listings within the choosen category (sorted in alphabetical order by title)
+    sorted_active_listings, next_cursor = active_listings_page(request, category_data)
 
     # Redirects user to view listings in the chose category
     return render(request, "auctions/category_listing.html",
@@ -160,6 +215,7 @@ def category_listing(request):
         "categories": sorted_other_category_data,
         "category": category_data,
         "listings": sorted_active_listings,
+        "next": next_cursor
     })
 
 
@@ -168,8 +224,7 @@ def category_listing(request):
 def create(request):
 
     # Gets all categories avaliable (sorted in alphabetical order by category name)
-    all_categories = Category.objects.all()
-    sorted_all_categories = sorted(all_categories, key=lambda category: category.category_name)
+    sorted_all_categories = Category.objects.order_by("category_name")
 
     # POST - allows user to create a new listing via a form
     if request.method == "POST":
@@ -194,7 +249,7 @@ def create(request):
         if initial_price <= 0:
             return render(request, "auctions/create.html",
         {
-            "categories": all_categories,
+            "categories": sorted_all_categories,
             "message_red_alert": "Error: Price must be a positive value"
         })
 
@@ -237,14 +292,14 @@ def your_listings(request):
         listing_type = request.POST["listing_type"]
 
         if listing_type == "active":
-            owner_listings = current_user.listing_user.filter(is_active=True)
+            owner_listings = current_user.listing_user.active()
         elif listing_type == "inactive":
-            owner_listings = current_user.listing_user.filter(is_active=False)
+            owner_listings = current_user.listing_user.inactive()
         else:
             owner_listings = current_user.listing_user.all()
 
         # Sort the user's own listings (in alphabetical order by title)
-        sorted_owner_listings = sorted(owner_listings, key=lambda listing: listing.title)
+        sorted_owner_listings = owner_listings.for_cards()
 
         # Displays the user's own listings 
         return render(request, "auctions/your_listings.html",
@@ -258,8 +313,7 @@ def your_listings(request):
 
         # Gets all listings owned by the user (sorted in alphabetical order by title)
         current_user = request.user
-        owner_listings = current_user.listing_user.all()
-        sorted_owner_listings = sorted(owner_listings, key=lambda listing: listing.title)
+        sorted_owner_listings = current_user.listing_user.for_cards()
 
         # Displays the user's listings 
         return render(request, "auctions/your_listings.html",
@@ -274,8 +328,7 @@ def watchlist(request):
 
     # Gets all active listings in the current user's watchlist (sorted in alphabetical order by title)
      current_user = request.user
-     watchlist_data = current_user.user_watchlist.filter(is_active=True)
-     sorted_watchlist_data = sorted(watchlist_data, key=lambda listing: listing.title)
+     sorted_watchlist_data = current_user.user_watchlist.active().for_cards()
 
     # Displays the user's watchlist 
      return render(request, "auctions/watchlist.html",
@@ -399,20 +452,9 @@ def delete_comment(request, id):
 @login_required(login_url='login')
 def bidlist(request):
      
-    # Gets all bids that the current user's holds the highest bid for
+    # Gets all listings whose highest bid the current user holds (sorted in alphabetical order by title of listing)
     current_user = request.user
-    bidlist_data = current_user.bid_user.all()
-
-    # Create a new list to store all bid listings 
-    bid_list = []
-
-    # Iterates through all highest bids the user holds and appends the associated listings to the bid_list
-    for bid in bidlist_data:
-         listing = Listing.objects.get(current_highest_bid=bid)
-         bid_list.append(listing)
-    
-    # Sort the highest biding list (in alphabetical order by title of listing)
-    sorted_bid_list = sorted(bid_list, key=lambda listing: listing.title)
+    sorted_bid_list = Listing.objects.filter(current_highest_bid__user=current_user).for_cards()
 
     # Displays the user's highest bidding list
     return render(request, "auctions/bidlist.html",
@@ -525,14 +567,14 @@ def close_listing(request, id):
     # Saves the winner of the listing
     listing_data.save()
 
-    # Gets all remaining active listings (sorted by alphabetical order by title)
-    active_listings = Listing.objects.filter(is_active=True)
-    sorted_active_listings = sorted(active_listings, key=lambda listing: listing.title)
+    # Gets the first page of remaining active listings (sorted by alphabetical order by title)
+    sorted_active_listings, next_cursor = Listing.objects.active().page(size=settings.AUCTIONS_PAGE_SIZE)
 
     # Redirects user to the homepage of active listings
     return render(request, "auctions/index.html",
         {
             "listings": sorted_active_listings,
+            "next": encode_cursor(next_cursor),
             "message_green_alert": f"Congratulations! Your listing for {listing_data.title} has been closed successfully!"
         })
 
@@ -543,8 +585,7 @@ def auctions_won(request):
      
     # Gets all listings the current user has won (sorted in alphabetical order by title)
     current_user = request.user
-    winner_listings = current_user.listing_winner.all()
-    sorted_winner_listings = sorted(winner_listings, key=lambda listing: listing.title)
+    sorted_winner_listings = current_user.listing_winner.for_cards()
 
     # Displays the bidding auctions the user has won
     return render(request, "auctions/auctions_won.html",
@@ -103,6 +103,10 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Number of listings shown on each page of active listings (homepage and category pages)
+AUCTIONS_PAGE_SIZE = 24
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 